@@ -1,5 +1,6 @@
 from django.contrib import admin
 from data.models import Country, Airport, AircraftType, Aircraft, Airline, Pilot, Steward, Route, Crew, FlightRouteLime
+from data.forms import FlightRouteLimeForm
 
 
 @admin.register(Country)
@@ -10,6 +11,7 @@ class OfferAdmin(admin.ModelAdmin):
 @admin.register(Airport)
 class OfferAdmin(admin.ModelAdmin):
     list_display = ['name', 'iata_code', 'icao_code', 'lat', 'lng', 'country', 'priority']
+    list_select_related = ['country']
 
 
 @admin.register(AircraftType)
@@ -25,16 +27,19 @@ class OfferAdmin(admin.ModelAdmin):
 @admin.register(Aircraft)
 class OfferAdmin(admin.ModelAdmin):
     list_display = ['reg', 'model', 'airline', 'hub', 'status']
+    list_select_related = ['model', 'airline', 'hub']
 
 
 @admin.register(Pilot)
 class OfferAdmin(admin.ModelAdmin):
     list_display = ['last_name', 'first_name', 'patronymic', 'sex', 'type_pilot', 'hub', 'airline']
+    list_select_related = ['hub', 'airline']
 
 
 @admin.register(Steward)
 class OfferAdmin(admin.ModelAdmin):
     list_display = ['last_name', 'first_name', 'patronymic', 'sex', 'hub']
+    list_select_related = ['hub']
 
 
 @admin.register(Route)
@@ -42,14 +47,19 @@ class OfferAdmin(admin.ModelAdmin):
     list_display = ['number', 'from_airport', 'to_airport', 'airline', 'days_of_week', 'is_international', 'is_regular',
                     'from_scheduled_time', 'to_scheduled_time'
                     ]
+    list_select_related = ['from_airport', 'to_airport', 'airline']
 
 
 @admin.register(FlightRouteLime)
 class OfferAdmin(admin.ModelAdmin):
+    form = FlightRouteLimeForm
     list_display = ["route", "from_datetime", "to_datetime", "crew", "aircraft"]
+    # Crew.__str__ shows the captain
+    list_select_related = ["route", "crew__pic", "aircraft"]
 
 
 @admin.register(Crew)
 class OfferAdmin(admin.ModelAdmin):
     list_display = ["pic", "co_pilot", "engineer"]
+    list_select_related = ["pic", "co_pilot", "engineer"]
 
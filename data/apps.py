@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class DataConfig(AppConfig):
     name = 'data'
+
+    def ready(self):
+        from data import signals  # noqa: F401
@@ -0,0 +1,134 @@
+from data.engine import FR24
+from data.resilience import FR24Error, FR24HTTPError, FR24ConnectionError, BatchResult, parse_retry_after
+from data.ratelimit import get_limiter
+from django.conf import settings
+import asyncio
+import aiohttp
+
+
+class AsyncFR24:
+    def __init__(self, concurrency=None, pool_size=None, cache_dir=None, cache_ttl=None):
+        if concurrency is None:
+            concurrency = getattr(settings, "FR24_CONCURRENCY", 100)
+        if pool_size is None:
+            pool_size = getattr(settings, "FR24_POOL_SIZE", 100)
+        self.concurrency = concurrency
+        self.pool_size = pool_size
+
+        # Static catalogs and URLs come from the sync client, they are served from its cache
+        self.fr24 = FR24(cache_dir=cache_dir, cache_ttl=cache_ttl)
+        self.api_url = self.fr24.api_url
+        self.dynamic_data = self.fr24.dynamic_data
+
+        self.session = None
+        self.semaphore = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def open(self):
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, limit_per_host=self.pool_size)
+            self.session = aiohttp.ClientSession(connector=connector, headers=dict(self.fr24.session.headers))
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+        self.fr24.close()
+
+    async def simple_request(self, url, params=None):
+        await self.open()
+        if params:
+            params = {key: str(value) for key, value in params.items()}
+        # Same retry policy and circuit breakers as the sync client
+        retry = self.fr24.retry
+        limiter = get_limiter(self.fr24.endpoint_group(url))
+        for attempt in range(retry.attempts):
+            breaker = self.fr24.breaker(url)
+            breaker.before_request()
+            try:
+                async with self.semaphore:
+                    # Same token buckets as the sync client
+                    await asyncio.sleep(limiter.reserve())
+                    async with self.session.get(url, params=params) as data:
+                        if data.status in retry.retry_statuses:
+                            breaker.record_failure()
+                            if data.status == 429:
+                                limiter.record_throttled()
+                            raise FR24HTTPError(url, data.status, parse_retry_after(data.headers.get("Retry-After")))
+                        breaker.record_success()
+                        if data.status != 200:
+                            raise FR24HTTPError(url, data.status)
+                        # The feed is served as text/javascript
+                        return await data.json(content_type=None)
+            except aiohttp.ClientError as e:
+                breaker.record_failure()
+                error = FR24ConnectionError(url, e)
+            except FR24Error as e:
+                error = e
+            if not error.retryable or attempt == retry.attempts - 1:
+                raise error
+            await asyncio.sleep(retry.delay(attempt, error.retry_after))
+
+    async def clever_request(self, urls):
+        answers = await asyncio.gather(*(self.simple_request(u) for u in urls), return_exceptions=True)
+        result = BatchResult()
+        for i, answer in enumerate(answers):
+            if isinstance(answer, Exception):
+                result.errors[i] = answer
+                answer = None
+            result.append(answer)
+        return result
+
+    async def get_flight(self, flight):
+        version = 1.5
+        url = self.api_url + self.dynamic_data["flight"]
+        params = {
+            'version': version,
+            'flight': flight,
+        }
+        return await self.simple_request(url=url, params=params)
+
+    async def get_flights_by_airline(self, airline):
+        url = self.api_url + self.dynamic_data["radar"]
+        params = {
+            'airline': airline,
+        }
+        return await self.simple_request(url=url, params=params)
+
+    async def get_flights_by_airport(self, airport):
+        url = self.api_url + self.dynamic_data["radar"]
+        params = {
+            'airport': airport,
+        }
+        return await self.simple_request(url=url, params=params)
+
+    async def get_flights_in_zone(self, north, south, west, east):
+        url = self.api_url + self.dynamic_data["radar"]
+        bounds = "{north},{south},{west},{east}".format(north=north, south=south, west=west, east=east)
+        params = {
+            'bounds': bounds,
+        }
+        return await self.simple_request(url=url, params=params)
+
+    async def get_flights(self):
+        loop = asyncio.get_running_loop()
+        # A cold catalog cache means one blocking request, keep it off the event loop
+        urls = await loop.run_in_executor(None, self.fr24.flights_urls)
+        answer = await self.clever_request(urls)
+        return self.fr24.merge_flights(answer)
+
+
+def run(coroutine):
+    # For sync callers: run one AsyncFR24 coroutine on a fresh event loop
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
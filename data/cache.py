@@ -0,0 +1,107 @@
+from django.conf import settings
+from urllib.parse import urlsplit
+import threading
+import json
+import time
+import os
+
+
+class CatalogCache:
+    # Process-wide layer, shared by every FR24 instance
+    memory = {}
+    lock = threading.Lock()
+
+    def __init__(self, directory=None, ttl=None, source=None):
+        if directory is None:
+            directory = getattr(settings, "FR24_CACHE_DIR", None)
+        if ttl is None:
+            ttl = getattr(settings, "FR24_CACHE_TTL", 24 * 60 * 60)
+        self.directory = directory
+        self.ttl = ttl
+        # Base URL of the server the catalogs come from: FR24 and a replay server never share entries
+        self.source = source
+
+    def key(self, name):
+        if not self.source:
+            return name
+        return "{}@{}".format(name, urlsplit(self.source).netloc.replace(":", "_"))
+
+    def path(self, name):
+        return os.path.join(self.directory, name + ".json")
+
+    def is_fresh(self, entry):
+        return time.time() - entry["fetched_at"] < self.ttl
+
+    def load(self, name):
+        entry = self.memory.get(name)
+        if entry is not None:
+            return entry
+
+        if not self.directory:
+            return None
+        try:
+            with open(self.path(name), encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        self.memory[name] = entry
+        return entry
+
+    def save(self, name, entry):
+        self.memory[name] = entry
+        if not self.directory:
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        # Write to a temporary file first, so a crash never leaves half a catalog on disk
+        tmp = self.path(name) + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp, self.path(name))
+
+    def get(self, name, fetch):
+        # fetch(headers) returns (status_code, response_headers, data).
+        # A 304 answer only refreshes the timestamp of the stored entry.
+        name = self.key(name)
+        entry = self.load(name)
+        if entry is not None and self.is_fresh(entry):
+            return entry["data"]
+
+        with self.lock:
+            # Another thread could have refreshed the entry while we were waiting
+            entry = self.load(name)
+            if entry is not None and self.is_fresh(entry):
+                return entry["data"]
+
+            headers = {}
+            if entry is not None:
+                if entry.get("etag"):
+                    headers["If-None-Match"] = entry["etag"]
+                if entry.get("last_modified"):
+                    headers["If-Modified-Since"] = entry["last_modified"]
+
+            status_code, response_headers, data = fetch(headers)
+            if status_code == 304 and entry is not None:
+                entry = dict(entry, fetched_at=time.time())
+            else:
+                entry = {
+                    "etag": response_headers.get("ETag"),
+                    "last_modified": response_headers.get("Last-Modified"),
+                    "fetched_at": time.time(),
+                    "data": data,
+                }
+            self.save(name, entry)
+            return entry["data"]
+
+    def clear(self, name=None):
+        if name is None:
+            names = set(self.memory)
+            if self.directory and os.path.isdir(self.directory):
+                names.update(f[:-5] for f in os.listdir(self.directory) if f.endswith(".json"))
+        else:
+            names = [self.key(name)]
+
+        for n in names:
+            self.memory.pop(n, None)
+            if self.directory and os.path.exists(self.path(n)):
+                os.remove(self.path(n))
@@ -0,0 +1,67 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.utils import make_template_fragment_key
+from functools import wraps
+import time
+
+# What every cached catalog page shows: a change of the key model makes the pages of these names stale
+depends = {
+    "country": ("country", "airport"),
+    "airport": ("airport",),
+    "airline": ("airline",),
+}
+
+
+def get_cache():
+    return caches[getattr(settings, "CATALOG_CACHE", "default")]
+
+
+def timeout():
+    return getattr(settings, "CATALOG_CACHE_TIMEOUT", 60 * 60)
+
+
+def version(name):
+    # Generation of a page group, part of every key of the group; bumping it drops the whole group at once
+    return get_cache().get_or_set("catalog:version:" + name, time.time_ns, None)
+
+
+def bump(name):
+    # A fresh value rather than incr(): a counter evicted and restarted could bring old pages back
+    cache = get_cache()
+    for group in depends.get(name, (name,)):
+        cache.set("catalog:version:" + group, time.time_ns(), None)
+
+
+def fragment_key(name, obj):
+    # Key of the {% cache %} fragment of one object, see the one_*.html templates
+    return make_template_fragment_key(name, [obj.pk])
+
+
+def forget(name, *objs):
+    get_cache().delete_many([fragment_key(name, obj) for obj in objs])
+
+
+def cached_view(*names):
+    # Read-through cache of whole pages for anonymous GET requests, keyed by path and the versions of names.
+    # Signed-in users see their name in the navbar, they get the cached fragments only.
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != "GET" or request.user.is_authenticated:
+                return view(request, *args, **kwargs)
+            cache = get_cache()
+            key = "catalog:view:{}:{}".format(request.get_full_path(), ":".join(str(version(n)) for n in names))
+            response = cache.get(key)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code == 200:
+                    cache.set(key, response, timeout())
+            return response
+        return wrapper
+    return decorator
+
+
+def versions(*names):
+    # Template context for the list fragments: {% cache cache_timeout airports versions.airport %}
+    return {"cache_timeout": timeout(), "cache_alias": getattr(settings, "CATALOG_CACHE", "default"),
+            "versions": {name: version(name) for name in names}}
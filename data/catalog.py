@@ -0,0 +1,50 @@
+import bisect
+
+
+class Catalog:
+    def __init__(self, items):
+        self.items = list(items)
+        self.by_iata = {}
+        self.by_icao = {}
+        self.by_country = {}
+
+        names = []
+        for item in self.items:
+            # The first row wins, same as the old linear search
+            if item.iata:
+                self.by_iata.setdefault(item.iata.upper(), item)
+            if item.icao:
+                self.by_icao.setdefault(item.icao.upper(), item)
+            country = getattr(item, "country", None)
+            if country:
+                self.by_country.setdefault(country, []).append(item)
+            names.append((item.name.lower(), item))
+
+        names.sort(key=lambda n: n[0])
+        self.names = [n[0] for n in names]
+        self.by_name = [n[1] for n in names]
+        self.countries = sorted(self.by_country)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def get_iata(self, iata):
+        return self.by_iata.get(iata.upper()) if iata else None
+
+    def get_icao(self, icao):
+        return self.by_icao.get(icao.upper()) if icao else None
+
+    def in_country(self, country):
+        return self.by_country.get(country, [])
+
+    def search_name(self, prefix, limit=None):
+        prefix = prefix.lower()
+        start = bisect.bisect_left(self.names, prefix)
+        # Every name with this prefix sorts before prefix + the last unicode symbol
+        end = bisect.bisect_left(self.names, prefix + "\U0010ffff", start)
+        if limit is not None:
+            end = min(end, start + limit)
+        return self.by_name[start:end]
@@ -0,0 +1,138 @@
+from data.models import Crew, FlightRouteLime
+from data.intervals import IntervalIndex
+from django.conf import settings
+from django.db.models import Q, OuterRef, Subquery
+import datetime
+
+
+def max_duration():
+    # No flight is longer than this; it bounds the index range scans on from_datetime
+    return datetime.timedelta(hours=getattr(settings, "FLIGHT_MAX_DURATION", 24))
+
+
+def crew_members(crews):
+    # crew id -> set of ("pilot", id) / ("steward", id)
+    members = {}
+    for crew in crews:
+        people = {("pilot", crew.pic_id), ("pilot", crew.co_pilot_id), ("pilot", crew.engineer_id)}
+        people.update(("steward", s.id) for s in crew.steward.all())
+        members[crew.id] = people
+    return members
+
+
+def overlapping(flights, start, end):
+    # Uses the (aircraft|crew, from_datetime) indexes: from_datetime is bounded on both sides
+    return flights.filter(from_datetime__gt=start - max_duration(), from_datetime__lt=end, to_datetime__gt=start)
+
+
+def bookings(field, start, end, exclude=()):
+    # (aircraft or crew id, flight id, departure, arrival, arrival airport) of the booked flights overlapping
+    # [start, end), field being "aircraft" or "crew"; the solvers plan around them
+    flights = overlapping(FlightRouteLime.objects.filter(**{field + "__isnull": False}).order_by(), start, end)
+    exclude = set(exclude)
+    return [row for row in flights.values_list(field + "_id", "id", "from_datetime", "to_datetime",
+                                               "route__to_airport_id") if row[1] not in exclude]
+
+
+def with_last_arrival(queryset, field, before):
+    # Annotates the aircraft (field="aircraft") or crews (field="crew") with last_arrival and last_airport:
+    # where and when the last flight departing before `before` lands, None if there is none
+    last = (FlightRouteLime.objects.filter(**{field: OuterRef("pk")}, from_datetime__lt=before)
+            .order_by("-from_datetime", "-id"))
+    return queryset.annotate(last_arrival=Subquery(last.values("to_datetime")[:1]),
+                             last_airport=Subquery(last.values("route__to_airport_id")[:1]))
+
+
+def find_conflicts(flight):
+    # Flights that share the aircraft or a crew member with flight and overlap it in time: one query each
+    conflicts = []
+    others = FlightRouteLime.objects.exclude(pk=flight.pk) if flight.pk else FlightRouteLime.objects.all()
+    others = others.order_by("from_datetime")
+
+    if flight.aircraft_id is not None:
+        for other in overlapping(others.filter(aircraft_id=flight.aircraft_id), flight.from_datetime,
+                                 flight.to_datetime):
+            conflicts.append((other, "aircraft"))
+
+    if flight.crew_id is not None:
+        crew = Crew.objects.prefetch_related("steward").get(pk=flight.crew_id)
+        pilots = [crew.pic_id, crew.co_pilot_id, crew.engineer_id]
+        stewards = [s.id for s in crew.steward.all()]
+        crews = Crew.objects.filter(Q(pic__in=pilots) | Q(co_pilot__in=pilots) | Q(engineer__in=pilots)
+                                    | Q(steward__in=stewards)).values_list("id", flat=True).distinct()
+        for other in overlapping(others.filter(crew__in=list(crews)), flight.from_datetime, flight.to_datetime):
+            conflicts.append((other, "crew"))
+    return conflicts
+
+
+class ConflictIndex:
+    # In-memory index for batch imports: load the bookings around the batch once,
+    # then every check and insert is O(log n) per aircraft / crew member.
+    def __init__(self):
+        self.aircraft = IntervalIndex()
+        self.people = IntervalIndex()
+        self.members = {}
+
+    def load(self, start, end, exclude=()):
+        flights = overlapping(FlightRouteLime.objects.order_by(), start, end)
+        if exclude:
+            flights = flights.exclude(id__in=exclude)
+        rows = list(flights.values_list("id", "from_datetime", "to_datetime", "aircraft_id", "crew_id"))
+        self.load_crews({row[4] for row in rows if row[4] is not None})
+        for pk, from_datetime, to_datetime, aircraft_id, crew_id in rows:
+            self.add(pk, from_datetime, to_datetime, aircraft_id, crew_id, force=True)
+        return self
+
+    def load_crews(self, crew_ids):
+        missing = set(crew_ids) - set(self.members)
+        if missing:
+            self.members.update(crew_members(Crew.objects.filter(id__in=missing).prefetch_related("steward")))
+
+    def conflicts(self, item, from_datetime, to_datetime, aircraft_id, crew_id):
+        found = []
+        if aircraft_id is not None:
+            found.extend((other, "aircraft") for other in
+                         self.aircraft.conflicts(aircraft_id, from_datetime, to_datetime, exclude=item))
+        if crew_id is not None:
+            self.load_crews([crew_id])
+            # A flight shared with several members of the crew is one conflict, as in find_conflicts
+            seen = set()
+            for person in self.members.get(crew_id, ()):
+                for other in self.people.conflicts(person, from_datetime, to_datetime, exclude=item):
+                    if other not in seen:
+                        seen.add(other)
+                        found.append((other, "crew"))
+        return found
+
+    def add(self, item, from_datetime, to_datetime, aircraft_id, crew_id, force=False):
+        # Books the flight unless it conflicts (or force is set); returns the conflicts
+        found = self.conflicts(item, from_datetime, to_datetime, aircraft_id, crew_id)
+        if found and not force:
+            return found
+        if aircraft_id is not None:
+            self.aircraft.add(aircraft_id, from_datetime, to_datetime, item, force=True)
+        if crew_id is not None:
+            for person in self.members.get(crew_id, ()):
+                self.people.add(person, from_datetime, to_datetime, item, force=True)
+        return found
+
+
+def check_flights(flights):
+    # Validates a batch of (possibly unsaved) flights against the database and each other.
+    # Returns [(flight, [(other flight id or object, "aircraft"|"crew"), ...])] for the conflicting ones.
+    flights = list(flights)
+    if not flights:
+        return []
+    start = min(f.from_datetime for f in flights)
+    end = max(f.to_datetime for f in flights)
+    # Saved flights of the batch are checked with their new values, not the stored ones
+    index = ConflictIndex().load(start, end, exclude=[f.pk for f in flights if f.pk is not None])
+    index.load_crews({f.crew_id for f in flights if f.crew_id is not None})
+
+    result = []
+    for f in sorted(flights, key=lambda x: x.from_datetime):
+        item = f.pk if f.pk is not None else f
+        found = index.add(item, f.from_datetime, f.to_datetime, f.aircraft_id, f.crew_id)
+        if found:
+            result.append((f, found))
+    return result
@@ -0,0 +1,193 @@
+from data.models import Pilot, Steward, Crew, FlightRouteLime
+from data.intervals import IntervalIndex
+from data.conflicts import bookings, with_last_arrival
+from data.engine import bulk_create_with_ids
+from django.conf import settings
+from django.db import transaction
+import datetime
+import heapq
+
+# Rows per INSERT/UPDATE statement
+batch_size = 1000
+
+
+def day_window(date):
+    start = datetime.datetime.combine(date, datetime.time(), tzinfo=datetime.timezone.utc)
+    return start, start + datetime.timedelta(days=1)
+
+
+class CrewPlan:
+    def __init__(self):
+        self.assignments = {}
+        # (flight, reason) for every flight no crew could take
+        self.unassigned = []
+        # Flights that lose their crew: reassigned, but no crew could take them
+        self.released = []
+
+    def apply(self):
+        flights = []
+        for flight, crew in self.assignments.values():
+            flight.crew = crew
+            flights.append(flight)
+        for flight in self.released:
+            # The planner has given the old crew to other flights
+            flight.crew = None
+            flights.append(flight)
+        FlightRouteLime.objects.bulk_update(flights, ["crew"], batch_size=batch_size)
+        return len(flights)
+
+
+class CrewAssigner:
+    def __init__(self, min_rest=None):
+        if min_rest is None:
+            min_rest = getattr(settings, "CREW_MIN_REST", 45)
+        # Minutes between the arrival of one flight and the departure of the next one of the same crew
+        self.rest = datetime.timedelta(minutes=min_rest)
+
+    def load_crews(self, airline_ids, before=None):
+        # With before every crew also gets last_arrival and last_airport of its last flight departing before it
+        crews = (Crew.objects.filter(pic__airline__in=airline_ids, pic__active=True, co_pilot__active=True,
+                                     engineer__active=True)
+                 .select_related("pic", "co_pilot", "engineer")
+                 .prefetch_related("pic__ratings", "co_pilot__ratings", "engineer__ratings"))
+        if before is not None:
+            crews = with_last_arrival(crews, "crew", before)
+        crews = list(crews)
+        for crew in crews:
+            # A crew can fly the types all three pilots are rated on
+            crew.types = ({t.id for t in crew.pic.ratings.all()} & {t.id for t in crew.co_pilot.ratings.all()}
+                          & {t.id for t in crew.engineer.ratings.all()})
+        return crews
+
+    def assign_day(self, date, reassign=False):
+        start, end = day_window(date)
+        flights = list(FlightRouteLime.objects.filter(from_datetime__gte=start, from_datetime__lt=end)
+                       .select_related("route", "aircraft").order_by("from_datetime", "id"))
+        return self.assign(flights, reassign=reassign)
+
+    def assign(self, flights, reassign=False):
+        plan = CrewPlan()
+        if not flights:
+            return plan
+        start = min(f.from_datetime for f in flights)
+        end = max(f.to_datetime for f in flights)
+        airline_ids = {f.route.airline_id for f in flights}
+        crews = {c.id: c for c in self.load_crews(airline_ids, before=start)}
+
+        # Pools of crews waiting at an airport: (airline, airport) -> heap of (free from, crew id).
+        # Every crew starts where its last flight before the window landed, or at the hub of its captain.
+        pools = {}
+        never = datetime.datetime.min.replace(tzinfo=datetime.timezone.utc)
+        for crew in crews.values():
+            if crew.last_airport is not None:
+                crew.location = crew.last_airport
+                free = crew.last_arrival + self.rest
+            else:
+                crew.location = crew.pic.hub_id
+                free = never
+            heapq.heappush(pools.setdefault((crew.pic.airline_id, crew.location), []), (free, crew.id))
+
+        # Duty windows (flight plus rest on both sides) per crew; items are (flight id, arrival airport).
+        # Flights outside the batch that reach into it (say, an overnight one of the day before) are booked too.
+        busy = IntervalIndex()
+        for crew_id, *booking in bookings("crew", start - self.rest, end + self.rest,
+                                          exclude=[f.id for f in flights]):
+            if crew_id in crews:
+                self.book(busy, pools, crew_id, crews[crew_id].pic.airline_id, *booking)
+        todo = []
+        for f in flights:
+            if f.crew_id is not None and not reassign:
+                self.book(busy, pools, f.crew_id, f.route.airline_id, f.id, f.from_datetime, f.to_datetime,
+                          f.route.to_airport_id)
+            else:
+                todo.append(f)
+
+        for f in sorted(todo, key=lambda x: (x.from_datetime, x.id)):
+            if f.aircraft is None:
+                reason = "no aircraft"
+                crew = None
+            else:
+                pool = pools.get((f.route.airline_id, f.route.from_airport_id), [])
+                reason = "no free rated crew at the departure airport"
+                crew = self.take(pool, f, crews, busy)
+            if crew is None:
+                plan.unassigned.append((f, reason))
+                if f.crew_id is not None:
+                    plan.released.append(f)
+                continue
+            plan.assignments[f.id] = (f, crew)
+            self.book(busy, pools, crew.id, f.route.airline_id, f.id, f.from_datetime, f.to_datetime,
+                      f.route.to_airport_id)
+        return plan
+
+    def book(self, busy, pools, crew_id, airline_id, flight_id, departure, arrival, airport_id):
+        busy.add(crew_id, departure - self.rest, arrival + self.rest, (flight_id, airport_id), force=True)
+        # After the flight the crew waits at the arrival airport until the rest is over
+        heapq.heappush(pools.setdefault((airline_id, airport_id), []), (arrival + self.rest, crew_id))
+
+    def take(self, pool, flight, crews, busy):
+        # Earliest free crew that is at the airport, rated on the aircraft and has no other duty in the window
+        skipped = []
+        found = None
+        while pool and pool[0][0] <= flight.from_datetime:
+            entry = heapq.heappop(pool)
+            crew = crews.get(entry[1])
+            if crew is None:
+                continue
+            last = busy.last_before(crew.id, flight.from_datetime)
+            location = last[2][1] if last else crew.location
+            if location != flight.route.from_airport_id:
+                # The crew has flown elsewhere since it was put in this pool
+                continue
+            if flight.aircraft.model_id in crew.types and busy.is_free(crew.id, flight.from_datetime,
+                                                                         flight.to_datetime):
+                found = crew
+                break
+            skipped.append(entry)
+        for entry in skipped:
+            heapq.heappush(pool, entry)
+        return found
+
+
+def pair_crews(airline, stewards_per_crew=4):
+    # Forms crews from active pilots (and stewards) of the airline that are not in any crew yet,
+    # matching pilots of the same hub with the same ratings first.
+    in_crews = set()
+    for ids in Crew.objects.filter(pic__airline=airline).values_list("pic_id", "co_pilot_id", "engineer_id"):
+        in_crews.update(ids)
+    pilots = [p for p in Pilot.objects.filter(airline=airline, active=True).prefetch_related("ratings")
+              if p.id not in in_crews]
+    busy_stewards = set(Crew.steward.through.objects.filter(crew__pic__airline=airline)
+                        .values_list("steward_id", flat=True))
+    stewards = {}
+    for s in Steward.objects.filter(airline=airline).exclude(id__in=busy_stewards):
+        stewards.setdefault(s.hub_id, []).append(s)
+
+    groups = {}
+    for p in pilots:
+        key = (p.hub_id, frozenset(t.id for t in p.ratings.all()))
+        groups.setdefault(key, {"C": [], "S": [], "E": []})[p.type_pilot].append(p)
+
+    # Exact rating matches first, then whoever is left at the hub
+    leftovers = {}
+    crews = []
+    for (hub_id, ratings), group in groups.items():
+        while group["C"] and group["S"] and group["E"]:
+            crews.append(Crew(pic=group["C"].pop(), co_pilot=group["S"].pop(), engineer=group["E"].pop()))
+        left = leftovers.setdefault(hub_id, {"C": [], "S": [], "E": []})
+        for kind in left:
+            left[kind].extend(group[kind])
+    for hub_id, group in leftovers.items():
+        while group["C"] and group["S"] and group["E"]:
+            crews.append(Crew(pic=group["C"].pop(), co_pilot=group["S"].pop(), engineer=group["E"].pop()))
+
+    with transaction.atomic():
+        bulk_create_with_ids(Crew, crews)
+        through = Crew.steward.through
+        rows = []
+        for crew in crews:
+            hub_stewards = stewards.get(crew.pic.hub_id, [])
+            for i in range(min(stewards_per_crew, len(hub_stewards))):
+                rows.append(through(crew_id=crew.id, steward_id=hub_stewards.pop().id))
+        through.objects.bulk_create(rows, batch_size=batch_size)
+    return crews
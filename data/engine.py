@@ -1,10 +1,25 @@
 from data.models import Country, AircraftType, Aircraft, Pilot, Steward
 from data.models import Airport as Airport_lime
 from data.models import Airline as Airline_lime
+from data.cache import CatalogCache
+from data.catalog import Catalog
+from data.flights import Flight, FlightBatch, iter_feed, stream_feed
+from data.resilience import FR24Error, FR24HTTPError, FR24ConnectionError, RetryPolicy, CircuitBreaker, \
+    BatchResult, parse_retry_after
+from data.ratelimit import ThrottledAdapter, get_limiter, get_metrics
+from data.replay import Recorder
+from data.hashing import hash_passwords
+from data import caching
 from django.contrib.auth.models import User
-import requests, grequests
-import sys
+from django.contrib.auth.hashers import make_password
+from django.conf import settings
+from django.db import transaction
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+import requests
+import itertools
 import random
+import time
 
 
 class FR24:
@@ -25,27 +40,114 @@ class FR24:
         'flight': '/clickhandler/'
     }
 
-    def search_airport(self, iata):
-        airports = self.get_airports()
-        for airport in airports:
-            if airport.iata == iata:
-                return airport
+    # Indexed catalogs per (base URL, name), rebuilt only when the cached rows change
+    catalogs = {}
+
+    def __init__(self, cache_dir=None, cache_ttl=None, pool_size=None, pool_hosts=None, base_url=None, api_url=None,
+                 record_dir=None):
+        # Both hosts can point at a replay server (data.replay, manage.py fr24_replay)
+        self.base_url = base_url or getattr(settings, "FR24_BASE_URL", self.base_url)
+        self.api_url = api_url or getattr(settings, "FR24_API_URL", self.api_url)
+        self.cache = CatalogCache(directory=cache_dir, ttl=cache_ttl, source=self.base_url)
+        if pool_size is None:
+            pool_size = getattr(settings, "FR24_POOL_SIZE", 100)
+        self.pool_size = pool_size
+        self.session = self.create_session(pool_size=pool_size, pool_hosts=pool_hosts)
+        self.retry = RetryPolicy(
+            attempts=getattr(settings, "FR24_RETRY_ATTEMPTS", 4),
+            backoff=getattr(settings, "FR24_RETRY_BACKOFF", 0.5),
+            max_backoff=getattr(settings, "FR24_RETRY_MAX_BACKOFF", 30),
+        )
+        self.breakers = {}
+
+        if record_dir is None:
+            record_dir = getattr(settings, "FR24_RECORD_DIR", None)
+        if record_dir:
+            self.session.hooks["response"].append(Recorder(record_dir).hook)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    @staticmethod
+    def accept_encoding():
+        # urllib3 decodes brotli only when one of these packages is installed
+        for module in ("brotli", "brotlicffi"):
+            try:
+                __import__(module)
+                return "gzip, deflate, br"
+            except ImportError:
+                pass
+        return "gzip, deflate"
+
+    def create_session(self, pool_size, pool_hosts=None):
+        if pool_hosts is None:
+            pool_hosts = getattr(settings, "FR24_POOL_HOSTS", 10)
+
+        session = requests.Session()
+        # pool_maxsize is the connection limit per host, pool_block makes extra requests wait for a free one.
+        # Every request, single or batched, takes a token of its endpoint group first.
+        adapter = ThrottledAdapter(self.endpoint_group, pool_connections=pool_hosts, pool_maxsize=pool_size,
+                                   pool_block=True)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers.update(self.base_headers)
+        session.headers.update({
+            "Accept-Encoding": self.accept_encoding(),
+            "Connection": "keep-alive",
+        })
+        return session
 
-        # Not found
-        return False
+    def search_airport(self, iata):
+        airport = self.airport_catalog().get_iata(iata)
+        if airport is None:
+            # Not found
+            return False
+        return airport
 
     def search_airline(self, icao):
-        airlines = self.get_airlines()
-        for airline in airlines:
-            if airline.icao == icao:
-                return airline
+        airline = self.airline_catalog().get_icao(icao)
+        if airline is None:
+            # Not found
+            return False
+        return airline
+
+    def search_airports_by_name(self, prefix, limit=None):
+        return self.airport_catalog().search_name(prefix, limit=limit)
+
+    def search_airlines_by_name(self, prefix, limit=None):
+        return self.airline_catalog().search_name(prefix, limit=limit)
+
+    def get_airports_in_country(self, country):
+        return self.airport_catalog().in_country(country)
 
-        # Not found
-        return False
+    def get_catalog(self, name, build):
+        rows = self.static_request(name)["rows"]
+        cached = self.catalogs.get((self.base_url, name))
+        if cached is None or cached[0] is not rows:
+            cached = (rows, Catalog(build(rows)))
+            self.catalogs[self.base_url, name] = cached
+        return cached[1]
+
+    def airport_catalog(self):
+        return self.get_catalog("airports", self.build_airports)
+
+    def airline_catalog(self):
+        return self.get_catalog("airlines", self.build_airlines)
 
     def get_airports(self):
-        url = self.base_url + self.static_data["airports"]
-        rows = self.simple_request(url=url)["rows"]
+        return list(self.airport_catalog())
+
+    def get_airlines(self):
+        return list(self.airline_catalog())
+
+    @staticmethod
+    def build_airports(rows):
         airports = []
         for airport in rows:
             a = Airport(
@@ -60,9 +162,8 @@ class FR24:
             airports.append(a)
         return airports
 
-    def get_airlines(self):
-        url = self.base_url + self.static_data["airlines"]
-        rows = self.simple_request(url=url)["rows"]
+    @staticmethod
+    def build_airlines(rows):
         airlines = []
         for airline in rows:
             a = Airline(
@@ -82,11 +183,13 @@ class FR24:
         }
         return self.simple_request(url=url, params=params)
 
-    def get_flights_by_airline(self, airline):
+    def get_flights_by_airline(self, airline, stream=False):
         url = self.api_url + self.dynamic_data["radar"]
         params = {
             'airline': airline,
         }
+        if stream:
+            return self.stream_request(url=url, params=params)
         return self.simple_request(url=url, params=params)
 
     def get_flights_by_airport(self, airport):
@@ -96,36 +199,129 @@ class FR24:
         }
         return self.simple_request(url=url, params=params)
 
-    def get_flights_in_zone(self, north, south, west, east):
+    def get_flights_in_zone(self, north, south, west, east, stream=False):
         url = self.api_url + self.dynamic_data["radar"]
         bounds = "{north},{south},{west},{east}".format(north=north, south=south, west=west, east=east)
         params = {
             'bounds': bounds,
         }
+        if stream:
+            return self.stream_request(url=url, params=params)
         return self.simple_request(url=url, params=params)
 
+    def get_flights_in_zones(self, zones):
+        # zones is a list of (north, south, west, east), answers come back in the same order
+        url = self.api_url + self.dynamic_data["radar"]
+        urls = []
+        for north, south, west, east in zones:
+            bounds = "{north},{south},{west},{east}".format(north=north, south=south, west=west, east=east)
+            params = {
+                'bounds': bounds,
+            }
+            urls.append(self.full_url(url=url, params=params))
+        return self.clever_request(urls)
+
+    def endpoint(self, url):
+        path = urlsplit(url).path
+        for name, endpoint in list(self.static_data.items()) + list(self.dynamic_data.items()):
+            if path == endpoint:
+                return name
+        return path
+
+    def endpoint_group(self, url):
+        if self.endpoint(url) in self.static_data:
+            return "static"
+        return "dynamic"
+
+    @staticmethod
+    def rate_metrics():
+        return get_metrics()
+
+    def breaker(self, url):
+        name = self.endpoint(url)
+        if name not in self.breakers:
+            self.breakers[name] = CircuitBreaker(
+                name,
+                failures=getattr(settings, "FR24_BREAKER_FAILURES", 5),
+                reset_timeout=getattr(settings, "FR24_BREAKER_RESET", 30),
+            )
+        return self.breakers[name]
+
+    def check_response(self, url, data):
+        # data is a response or the exception raised while sending the request
+        breaker = self.breaker(url)
+        if isinstance(data, Exception) or data is None:
+            breaker.record_failure()
+            raise FR24ConnectionError(url, data)
+        if data.status_code in self.retry.retry_statuses:
+            breaker.record_failure()
+            if data.status_code == 429:
+                get_limiter(self.endpoint_group(url)).record_throttled()
+            retry_after = parse_retry_after(data.headers.get("Retry-After"))
+            data.close()
+            raise FR24HTTPError(url, data.status_code, retry_after=retry_after)
+        breaker.record_success()
+        return data
+
     @staticmethod
     def check_request(data):
         if data.status_code == 200:
             return data.json()
-        else:
-            error_text = "Error 1. Server return request with {} code.".format(data.status_code)
-            print(error_text)
-            sys.exit()
-            # raise Exception(error_text)
+        raise FR24HTTPError(data.url, data.status_code)
+
+    def request(self, url, params=None, headers=None, stream=False):
+        for attempt in range(self.retry.attempts):
+            self.breaker(url).before_request()
+            try:
+                data = self.session.get(url=url, params=params, headers=headers, stream=stream)
+            except requests.RequestException as e:
+                data = e
+            try:
+                return self.check_response(url, data)
+            except FR24Error as e:
+                if not e.retryable or attempt == self.retry.attempts - 1:
+                    raise
+                time.sleep(self.retry.delay(attempt, e.retry_after))
 
     def simple_request(self, url, params={}):
-        data = requests.get(url=url, headers=self.base_headers, params=params)
+        data = self.request(url=url, params=params)
         data_json = self.check_request(data=data)
         return data_json
 
+    def stream_request(self, url, params={}, seen=None):
+        # Yields Flight records as the feed body arrives instead of decoding it whole
+        data = self.request(url=url, params=params, stream=True)
+        try:
+            if data.status_code != 200:
+                self.check_request(data=data)
+            data.raw.decode_content = True
+            for key, row in stream_feed(data.raw):
+                if seen is not None:
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                yield Flight.from_feed(key, row)
+        finally:
+            data.close()
+
+    def static_request(self, name):
+        url = self.base_url + self.static_data[name]
+
+        def fetch(headers):
+            data = self.request(url=url, headers=headers)
+            if data.status_code == 304:
+                return data.status_code, data.headers, None
+            return data.status_code, data.headers, self.check_request(data=data)
+
+        return self.cache.get(name, fetch)
+
     def get_icao_airlines(self):
-        c = self.get_airlines()
+        c = self.static_request("airlines")
         mas = []
         for a in c["rows"]:
             s = a["ICAO"]
             mas.append(s)
-        return mas,
+        return mas
 
     def full_url(self, url, params):
         full = self.api_url + self.dynamic_data["radar"]+"?"
@@ -134,15 +330,53 @@ class FR24:
         full = full[:-1]
         return full
 
-    def clever_request(self, urls):
-        rs = (grequests.get(u, headers=self.base_headers) for u in urls)
-        data_json = []
-        for r in grequests.imap(rs, size=1000):
-            data_json.append(self.check_request(data=r))
-
-            # print(r.status_code, r.url, r.json())
-        return data_json
+    def fetch(self, url):
+        # One request of a batch: the response, or the exception it failed with
+        try:
+            return self.session.get(url)
+        except requests.RequestException as e:
+            return e
 
+    def clever_request(self, urls):
+        # Threads over the shared session: the pool (pool_block) bounds the connections, the limiter the rate
+        urls = list(urls)
+        result = BatchResult([None] * len(urls))
+        pending = list(range(len(urls)))
+        for attempt in range(self.retry.attempts):
+            sent = []
+            for i in pending:
+                try:
+                    self.breaker(urls[i]).before_request()
+                except FR24Error as e:
+                    result.errors[i] = e
+                else:
+                    sent.append(i)
+
+            responses = []
+            if sent:
+                # map keeps the order of urls, a failed request comes back as its exception
+                with ThreadPoolExecutor(max_workers=min(self.pool_size, len(sent))) as pool:
+                    responses = list(pool.map(self.fetch, [urls[i] for i in sent]))
+
+            pending = []
+            delay = 0
+            for i, r in zip(sent, responses):
+                try:
+                    result[i] = self.check_request(data=self.check_response(urls[i], r))
+                    result.errors.pop(i, None)
+                except FR24Error as e:
+                    result.errors[i] = e
+                    if e.retryable:
+                        pending.append(i)
+                        delay = max(delay, self.retry.delay(attempt, e.retry_after))
+                except ValueError as e:
+                    # Truncated or broken JSON body
+                    result.errors[i] = FR24ConnectionError(urls[i], e)
+
+            if not pending or attempt == self.retry.attempts - 1:
+                break
+            time.sleep(delay)
+        return result
 
     @staticmethod
     def get_many_params(params):
@@ -152,33 +386,78 @@ class FR24:
         s = s[:-1]
         return s
 
-    def get_flights(self):
+    def get_flights(self, stream=False):
+        if stream:
+            return self.stream_flights()
+        answer = self.clever_request(self.flights_urls())
+        return self.merge_flights(answer)
+
+    def stream_flights(self):
+        # Batches are read one after another, the first records arrive after a single request
+        seen = set()
+        for url in self.flights_urls():
+            yield from self.stream_request(url=url, seen=seen)
+
+    def flights_urls(self, max_length=None):
         url = self.api_url + self.dynamic_data["radar"]
         airlines = self.get_icao_airlines()
 
-        # Max lenght URL is 2000 symbols, but this URL is >5200 symbols.
-        # That's why I divide into three URLs
-        a = self.get_many_params(airlines[:500])
-        b = self.get_many_params(airlines[501:1000])
-        c = self.get_many_params(airlines[1001:])
-
         urls = []
-        for n in [a, b, c]:
+        for batch in self.plan_batches(airlines, url=url, key="airline", max_length=max_length):
             params = {
-                'airline': n,
+                'airline': self.get_many_params(batch),
             }
             urls.append(self.full_url(url=url, params=params))
-        answer = self.clever_request(urls)
+        return urls
+
+    @staticmethod
+    def plan_batches(codes, url, key, max_length=None):
+        # Pack codes into as few "url?key=A,B,C" URLs as fit under max_length
+        if max_length is None:
+            max_length = getattr(settings, "FR24_MAX_URL_LENGTH", 2000)
+        base_length = len(url) + len(key) + 2
+
+        batches = []
+        batch = []
+        length = base_length
+        seen = set()
+        for code in codes:
+            if not code or code in seen:
+                continue
+            seen.add(code)
+
+            extra = len(code) + (1 if batch else 0)
+            if batch and length + extra > max_length:
+                batches.append(batch)
+                batch = []
+                length = base_length
+                extra = len(code)
+            batch.append(code)
+            length += extra
+        if batch:
+            batches.append(batch)
+        return batches
 
-        all_flights = []
-        stop_words = ["full_count", "version"]
+    @staticmethod
+    def merge_flights(answer):
+        # Batches can overlap (code-shares, repeated codes), keep one record per flight key
+        all_flights = {}
         for n in answer:
-            for flight in n:
-                if flight not in stop_words:
-                    d = [flight, n[flight]]
-                    all_flights.append(d)
+            if n is None:
+                # Failed batch, the error is kept in answer.errors
+                continue
+            for flight, row in iter_feed(n):
+                all_flights[flight] = row
+
+        return BatchResult([[flight, all_flights[flight]] for flight in all_flights],
+                           errors=getattr(answer, "errors", None))
 
-        return all_flights
+    def get_flight_records(self):
+        return [Flight.from_feed(key, row) for key, row in self.get_flights()]
+
+    def get_flight_batch(self):
+        answer = self.clever_request(self.flights_urls())
+        return FlightBatch.from_feed([n for n in answer if n is not None])
 
     def print_flights_by_lines(self):
         flights = self.get_flights()
@@ -186,37 +465,12 @@ class FR24:
             print(f)
 
     def print_flights_all_data(self):
-        flights = self.get_flights()
-        for f in flights:
-            key = f[0]
-            mode_s = f[1][0]
-            lat = f[1][1]
-            lng = f[1][2]
-            track = f[1][3]
-            alt = f[1][4]
-            ground_spend = f[1][5]
-            squawk = f[1][6]
-            radar = f[1][7]
-            type_aircraft = f[1][8]
-            reg_code = f[1][9]
-            timestamp = f[1][10]
-            from_airport = f[1][11]
-            to_airport = f[1][12]
-            iata_flights = f[1][13]
-            icao_flights = f[1][16]
-            airline = f[1][18]
-            print(key, mode_s, lat, lng, track, alt, ground_spend, squawk, radar, type_aircraft, reg_code,
-                  timestamp, from_airport, to_airport, icao_flights, iata_flights, airline)
+        for f in self.get_flight_records():
+            print(f.key, f.mode_s, f.lat, f.lng, f.track, f.alt, f.ground_speed, f.squawk, f.radar, f.type_aircraft,
+                  f.reg_code, f.timestamp, f.from_airport, f.to_airport, f.icao_flight, f.iata_flight, f.airline)
 
     def get_countries(self):
-        airports = self.get_airports()
-        countries = []
-        for i in airports:
-            if i.country in countries:
-                pass
-            else:
-                countries.append(i.country)
-        return sorted(countries)
+        return list(self.airport_catalog().countries)
 
 
 class Airport:
@@ -243,26 +497,86 @@ class Airline:
         return self.name
 
 
-def create_countries():
-    a = FR24().get_countries()
-    for i in a:
-        Country.objects.create(name=i.name)
+# Rows per INSERT/UPDATE statement in bulk imports
+batch_size = 500
 
 
-def create_airports():
-    a = FR24().get_airports()
-    for i in a:
-        country = Country.objects.get(name=i.country)
-        Airport_lime.objects.get_or_create(
-            name=i.name,
-            defaults={
-                'iata_code': i.iata,
-                'icao_code': i.icao,
-                'lat': i.lat,
-                'lng': i.lon,
-                'country': country,
-            }
-        )
+def create_countries(fr24=None):
+    names = (fr24 or FR24()).get_countries()
+    with transaction.atomic():
+        existing = set(Country.objects.values_list("name", flat=True))
+        new = [Country(name=name) for name in names if name and name not in existing]
+        Country.objects.bulk_create(new, batch_size=batch_size)
+    # Bulk queries send no signals, see data.signals
+    caching.bump("country")
+    return len(new)
+
+
+def create_airports(fr24=None):
+    fr24 = fr24 or FR24()
+    airports = fr24.get_airports()
+    created = []
+    updated = []
+    skipped = 0
+    with transaction.atomic():
+        # Countries first, so every airport has one to point at
+        create_countries(fr24)
+        countries = dict(Country.objects.values_list("name", "id"))
+        existing = {a.name: a for a in Airport_lime.objects.all()}
+
+        rows = {}
+        for i in airports:
+            country_id = countries.get(i.country)
+            if i.name in rows or country_id is None or not i.iata or not i.icao:
+                skipped += 1
+                continue
+            rows[i.name] = (i.iata, i.icao, i.lat, i.lon, country_id)
+
+        # IATA and ICAO codes are unique. Airports missing from the catalog keep theirs; of the others the first
+        # airport with a code gets it, codes that existing airports move away from being free whatever the order.
+        # An existing airport that cannot get its codes keeps the old ones, which may turn others away: repeat.
+        kept = set(existing) - set(rows)
+        while True:
+            taken = {}
+            for name in kept:
+                taken["iata", existing[name].iata_code] = taken["icao", existing[name].icao_code] = name
+            refused = []
+            for name, (iata, icao, lat, lng, country_id) in rows.items():
+                if taken.get(("iata", iata), name) != name or taken.get(("icao", icao), name) != name:
+                    refused.append(name)
+                else:
+                    taken["iata", iata] = taken["icao", icao] = name
+            moved = [name for name in refused if name in existing]
+            if not moved:
+                break
+            for name in moved:
+                del rows[name]
+                kept.add(name)
+                skipped += 1
+        for name in refused:
+            del rows[name]
+            skipped += 1
+
+        for name, (iata, icao, lat, lng, country_id) in rows.items():
+            a = existing.get(name)
+            if a is None:
+                created.append(Airport_lime(name=name, iata_code=iata, icao_code=icao, lat=lat, lng=lng,
+                                            country_id=country_id))
+            elif (a.iata_code, a.icao_code, a.lat, a.lng, a.country_id) != (iata, icao, lat, lng, country_id):
+                a.iata_code = iata
+                a.icao_code = icao
+                a.lat = lat
+                a.lng = lng
+                a.country_id = country_id
+                updated.append(a)
+
+        # Updates first: a new airport may take a code an existing one has just given up
+        bulk_update_unique(Airport_lime, updated, ["iata_code", "icao_code", "lat", "lng", "country"],
+                           ["iata_code", "icao_code"])
+        Airport_lime.objects.bulk_create(created, batch_size=batch_size)
+    caching.bump("airport")
+    caching.forget("one_airport", *updated)
+    return {"created": len(created), "updated": len(updated), "skipped": skipped}
 
 
 name_man = ["Александр", "Денис", "Сергей", "Андрей", "	Дмитрий", "	Максим", "Алексей", "Артем", "Иван", "Роман",
@@ -1511,37 +1825,8 @@ types_aircrafts = [
 ]
 
 
-def generate_person_steward(count_man, count_woman, code_hub="DME", iata_code="U6"):
-    for i in range(count_man):
-        name = random.choice(name_man)
-        last = random.choice(last_name)
-        par = random.choice(patronymic_man)
-
-        hub = Airport_lime.objects.get(iata_code=code_hub)
-        airline = Airline_lime.objects.get(iata_code=iata_code)
-        Steward.objects.create(
-            first_name=name,
-            last_name=last,
-            patronymic=par,
-            sex="M",
-            hub=hub,
-            airline=airline
-        )
-
-    for i in range(count_woman):
-        name = random.choice(name_woman)
-        last = random.choice(last_name)+"а"
-        par = random.choice(patronymic_woman)
-
-        hub = Airport_lime.objects.get(iata_code=code_hub)
-        Steward.objects.create(
-            first_name=name,
-            last_name=last,
-            patronymic=par,
-            sex="W",
-            hub=hub,
-            airline=airline
-        )
+def generate_person_steward(count_man, count_woman, code_hub="DME", iata_code="U6", seed=None):
+    return generate_crew(Steward, count_man, count_woman, code_hub=code_hub, iata_code=iata_code, seed=seed)
 
 
 def create_type_aircraft():
@@ -1554,87 +1839,199 @@ def create_type_aircraft():
         )
 
 
-def generate_person_pilot(count_man, count_woman, code_hub="DME", iata_code="U6", type_pilot="C", ratings=["A319", "A320"]):
-    for i in range(count_man):
-        name = random.choice(name_man)
-        last = random.choice(last_name)
-        par = random.choice(patronymic_man)
-
-        hub = Airport_lime.objects.get(iata_code=code_hub)
-        airline = Airline_lime.objects.get(iata_code=iata_code)
-
-        a = Pilot.objects.create(
-            first_name=name,
-            last_name=last,
-            patronymic=par,
-            sex="M",
-            hub=hub,
-            airline=airline,
-            type_pilot=type_pilot,
-        )
-        for t in ratings:
-            aircraft_type = AircraftType.objects.get(icao_code=t)
-            a.ratings.add(aircraft_type)
-
-    for i in range(count_man):
-        name = random.choice(name_woman)
-        last = random.choice(last_name)+"а"
-        par = random.choice(patronymic_woman)
-
-        hub = Airport_lime.objects.get(iata_code=code_hub)
-        airline = Airline_lime.objects.get(iata_code=iata_code)
-
-        a = Pilot.objects.create(
-            first_name=name,
-            last_name=last,
-            patronymic=par,
-            sex="W",
-            hub=hub,
-            airline=airline,
-            type_pilot=type_pilot,
-        )
-        for t in ratings:
-            aircraft_type = AircraftType.objects.get(icao_code=t)
-            a.ratings.add(aircraft_type)
+def generate_person_pilot(count_man, count_woman, code_hub="DME", iata_code="U6", type_pilot="C", ratings=["A319", "A320"],
+                          seed=None):
+    return generate_crew(Pilot, count_man, count_woman, code_hub=code_hub, iata_code=iata_code, seed=seed,
+                         type_pilot=type_pilot, ratings=ratings)
+
+
+def random_person(rnd, sex):
+    if sex == "M":
+        return rnd.choice(name_man), rnd.choice(last_name), rnd.choice(patronymic_man)
+    return rnd.choice(name_woman), rnd.choice(last_name) + "а", rnd.choice(patronymic_woman)
+
+
+def bulk_create_with_ids(model, objs):
+    # Not every database returns primary keys from bulk_create: then read back the rows inserted
+    # after the previous maximum id, in insertion order. Run it inside a transaction.
+    last = model.objects.order_by("-id").values_list("id", flat=True).first() or 0
+    model.objects.bulk_create(objs, batch_size=batch_size)
+    if objs and objs[0].pk is None:
+        ids = model.objects.filter(id__gt=last).order_by("id").values_list("id", flat=True)
+        for obj, pk in zip(objs, ids):
+            obj.pk = pk
+    return objs
+
+
+# Parked unique values are made of these: no real name or code is
+placeholder_chars = "!#$%&*+-=?@^_~"
+
+
+def placeholders(model, fields, count):
+    # count tuples of distinct values for fields that no real row has and that fit the columns
+    columns = []
+    for field in fields:
+        length = min(model._meta.get_field(field).max_length, 4)
+        columns.append(["".join(p) for p in itertools.islice(itertools.product(placeholder_chars, repeat=length),
+                                                              count)])
+    return list(zip(*columns))
+
+
+def bulk_update_unique(model, objs, fields, unique):
+    # bulk_update of rows that may take unique values (codes, names) other rows of objs give up in the same run.
+    # The database checks a unique index row by row, so a row is written only once no other row holds its new
+    # values any more; rows waiting on each other (swaps) are parked on placeholder values first.
+    pending = {obj.pk: obj for obj in objs}
+    current = {pk: values for pk, *values in model.objects.filter(pk__in=list(pending)).values_list("pk", *unique)}
+    held = {(field, value): pk for pk, values in current.items() for field, value in zip(unique, values)}
+    while pending:
+        ready = [obj for pk, obj in pending.items()
+                 if all(held.get((field, getattr(obj, field)), pk) == pk for field in unique)]
+        if not ready:
+            parked = [model(pk=pk, **dict(zip(unique, values)))
+                      for pk, values in zip(pending, placeholders(model, unique, len(pending)))]
+            model.objects.bulk_update(parked, unique, batch_size=batch_size)
+            held = {}
+            ready = list(pending.values())
+        model.objects.bulk_update(ready, fields, batch_size=batch_size)
+        for obj in ready:
+            del pending[obj.pk]
+            for field, value in zip(unique, current[obj.pk]):
+                if held.get((field, value)) == obj.pk:
+                    del held[field, value]
+
+
+def generate_crew(model, count_man, count_woman, code_hub="DME", iata_code="U6", seed=None, type_pilot="C",
+                  ratings=()):
+    # model is Pilot or Steward; the same seed gives the same people
+    rnd = random.Random(seed)
+    hub = Airport_lime.objects.get(iata_code=code_hub)
+    airline = Airline_lime.objects.get(iata_code=iata_code)
+    extra = {}
+    if model is Pilot:
+        extra["type_pilot"] = type_pilot
+        ratings = list(AircraftType.objects.filter(icao_code__in=ratings).values_list("id", flat=True))
+
+    people = []
+    for sex, count in (("M", count_man), ("W", count_woman)):
+        for i in range(count):
+            first, last, par = random_person(rnd, sex)
+            people.append(model(first_name=first, last_name=last, patronymic=par, sex=sex, hub=hub, airline=airline,
+                                **extra))
+
+    with transaction.atomic():
+        bulk_create_with_ids(model, people)
+        if model is Pilot and ratings:
+            through = Pilot.ratings.through
+            rows = [through(pilot_id=p.pk, aircrafttype_id=t) for p in people for t in ratings]
+            through.objects.bulk_create(rows, batch_size=batch_size)
+    return people
+
+
+def airline_username(icao):
+    return "AirCompany" + icao
+
+
+def airline_usernames(icaos):
+    # icao -> username for the account of a new airline. ICAO codes change hands, so AirCompany<ICAO> may
+    # still belong to the airline that held the code before: then AirCompany<ICAO>-2, -3, ... is used.
+    result = {}
+    names = {icao: airline_username(icao) for icao in icaos}
+    n = 1
+    while names:
+        linked = set(User.objects.filter(username__in=list(names.values()), airline__isnull=False)
+                     .values_list("username", flat=True))
+        n += 1
+        for icao, name in names.items():
+            if name not in linked:
+                result[icao] = name
+        names = {icao: "{}-{}".format(airline_username(icao), n) for icao, name in names.items() if name in linked}
+    return result
+
+
+def sync_airlines(fr24=None, password=None):
+    airlines = (fr24 or FR24()).get_airlines()
+    inserted = []
+    updated = {}
+    skipped = 0
+    with transaction.atomic():
+        existing = list(Airline_lime.objects.only("id", "name", "iata_code", "icao_code"))
+        by_icao = {a.icao_code: a for a in existing}
+        by_iata = {a.iata_code: a for a in existing}
+        by_name = {a.name: a for a in existing}
+
+        for i in airlines:
+            # Codes longer than the model fields are not airline designators
+            if not i.name or not i.iata or not i.icao or len(i.iata) > 2 or len(i.icao) > 3:
+                skipped += 1
+                continue
+
+            a = by_icao.get(i.icao) or by_iata.get(i.iata) or by_name.get(i.name)
+            if a is None:
+                a = Airline_lime(name=i.name, iata_code=i.iata, icao_code=i.icao)
+                inserted.append(a)
+            else:
+                if (a.name, a.iata_code, a.icao_code) == (i.name, i.iata, i.icao):
+                    continue
+                # Another airline already holds one of the new values
+                if by_icao.get(i.icao, a) is not a or by_iata.get(i.iata, a) is not a or by_name.get(i.name, a) is not a:
+                    skipped += 1
+                    continue
+                del by_icao[a.icao_code], by_iata[a.iata_code], by_name[a.name]
+                a.name = i.name
+                a.iata_code = i.iata
+                a.icao_code = i.icao
+                if a.pk is not None:
+                    updated[a.pk] = a
+            by_icao[a.icao_code] = a
+            by_iata[a.iata_code] = a
+            by_name[a.name] = a
+
+        usernames = airline_usernames([a.icao_code for a in inserted])
+        accounts = provision_accounts(list(usernames.values()), password=password)
+        for a in inserted:
+            a.account_id = accounts[usernames[a.icao_code]]
+
+        # Updates first: a new airline may take a code an existing one has just given up.
+        # Updated airlines may also take codes from each other, see bulk_update_unique.
+        bulk_update_unique(Airline_lime, list(updated.values()), ["name", "iata_code", "icao_code"],
+                           ["name", "iata_code", "icao_code"])
+        Airline_lime.objects.bulk_create(inserted, batch_size=batch_size)
+    caching.bump("airline")
+    caching.forget("one_airline", *updated.values())
+    return {"inserted": len(inserted), "updated": len(updated), "skipped": skipped}
+
+
+def provision_accounts(usernames, email="qq@qq.ru", password=None, passwords=None, hashed=False, workers=None):
+    # Returns {username: user id} and creates the missing users in bulk.
+    # passwords maps username -> own password, the others get password; None makes the password unusable.
+    # With hashed=True the passwords are stored as given, e.g. copied from another database.
+    existing = dict(User.objects.filter(username__in=usernames).values_list("username", "id"))
+    missing = [name for name in usernames if name not in existing]
+    own = {name: (passwords or {}).get(name, password) for name in missing}
+
+    if hashed:
+        hashes = {p: p for p in own.values()}
+        # There is no hash to copy for None
+        hashes[None] = make_password(None)
+    else:
+        hashes = hash_passwords(list(own.values()), workers=workers)
+
+    new = [User(username=name, email=email, password=hashes[own[name]]) for name in missing]
+    with transaction.atomic():
+        User.objects.bulk_create(new, batch_size=batch_size)
+    # Not every database returns primary keys from bulk_create
+    existing.update(User.objects.filter(username__in=missing).values_list("username", "id"))
+    return existing
 
 
-# Потом подправить эту функцию
 def create_airlines():
-    airlines = FR24().get_airlines()
-    kol = 0
-    for i in airlines:
-        if len(i.iata) or len(i.icao) < 1:
-            s = "AirCompany"+str(kol)
-            kol += 1
+    return sync_airlines()
 
-            try:
-                foo = Airline_lime.objects.get(iata_code=i.iata)
-            except Airline_lime.DoesNotExist:
-                foo = None
 
-            try:
-                foo1 = Airline_lime.objects.get(name=i.name)
-            except Airline_lime.DoesNotExist:
-                foo1 = None
-
-            if foo is None and foo1 is None:
-                Airline_lime.objects.update_or_create(
-                    iata_code=i.iata,
-                    defaults={
-                        'name': i.name,
-                        'icao_code': i.icao,
-                        'account': User.objects.get(username=s),
-                    }
-                )
-
-
-def generate_users():
-    kol = 0
-    for i in range(1325):
-        s = "AirCompany"+str(kol)
-        kol += 1
-        user = User.objects.create_user(username=s, email="qq@qq.ru", password="password")
-        user.save()
+def generate_users(count=1325, password="password"):
+    usernames = ["AirCompany" + str(kol) for kol in range(count)]
+    return provision_accounts(usernames, password=password)
 
 
 def generate_aircraft(code, model, airline="U6", hub="DME", status=True):
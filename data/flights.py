@@ -0,0 +1,181 @@
+import numpy as np
+import sys
+
+# Fast parsers are optional: ijson (C backend if compiled) streams the feed, orjson speeds up whole-body decoding
+try:
+    import ijson
+    try:
+        ijson = ijson.get_backend("yajl2_c")
+    except ImportError:
+        pass
+except ImportError:
+    ijson = None
+
+try:
+    from orjson import loads
+except ImportError:
+    from json import loads
+
+stop_words = ["full_count", "version", "stats"]
+
+
+def intern(value):
+    if isinstance(value, str):
+        return sys.intern(value)
+    return value
+
+
+class Flight:
+    # Positions of the fields in a feed record: {"<key>": [mode_s, lat, lng, ...]}
+    __slots__ = ("key", "mode_s", "lat", "lng", "track", "alt", "ground_speed", "squawk", "radar",
+                 "type_aircraft", "reg_code", "timestamp", "from_airport", "to_airport", "iata_flight",
+                 "on_ground", "vertical_speed", "icao_flight", "airline")
+
+    def __init__(self, key, mode_s, lat, lng, track, alt, ground_speed, squawk, radar, type_aircraft,
+                 reg_code, timestamp, from_airport, to_airport, iata_flight, on_ground, vertical_speed,
+                 icao_flight, airline):
+        self.key = key
+        self.mode_s = mode_s
+        self.lat = lat
+        self.lng = lng
+        self.track = track
+        self.alt = alt
+        self.ground_speed = ground_speed
+        self.squawk = squawk
+        self.radar = radar
+        self.type_aircraft = type_aircraft
+        self.reg_code = reg_code
+        self.timestamp = timestamp
+        self.from_airport = from_airport
+        self.to_airport = to_airport
+        self.iata_flight = iata_flight
+        self.on_ground = on_ground
+        self.vertical_speed = vertical_speed
+        self.icao_flight = icao_flight
+        self.airline = airline
+
+    @classmethod
+    def from_feed(cls, key, row):
+        return cls(
+            key=key,
+            mode_s=row[0],
+            lat=row[1],
+            lng=row[2],
+            track=row[3],
+            alt=row[4],
+            ground_speed=row[5],
+            squawk=row[6],
+            radar=intern(row[7]),
+            type_aircraft=intern(row[8]),
+            reg_code=row[9],
+            timestamp=row[10],
+            from_airport=intern(row[11]),
+            to_airport=intern(row[12]),
+            iata_flight=row[13],
+            on_ground=bool(row[14]),
+            vertical_speed=row[15],
+            icao_flight=row[16],
+            airline=intern(row[18]),
+        )
+
+    def __str__(self):
+        return self.key
+
+    def __repr__(self):
+        return "<Flight {} {}>".format(self.key, self.icao_flight)
+
+
+def iter_feed(answer):
+    for key in answer:
+        if key not in stop_words:
+            yield key, answer[key]
+
+
+def stream_feed(fileobj):
+    # Yields (key, row) while the body is still being read
+    if ijson is None:
+        yield from iter_feed(loads(fileobj.read()))
+        return
+
+    for key, row in ijson.kvitems(fileobj, "", use_float=True):
+        if key not in stop_words:
+            yield key, row
+
+
+class FlightBatch:
+    numeric = (
+        ("lat", np.float32),
+        ("lng", np.float32),
+        ("track", np.int16),
+        ("alt", np.int32),
+        ("ground_speed", np.int16),
+        ("timestamp", np.int64),
+        ("on_ground", np.bool_),
+        ("vertical_speed", np.int32),
+    )
+    strings = ("key", "mode_s", "squawk", "radar", "type_aircraft", "reg_code", "from_airport", "to_airport",
+               "iata_flight", "icao_flight", "airline")
+
+    def __init__(self, columns):
+        self.columns = columns
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__["columns"][name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __len__(self):
+        return len(self.columns["key"])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __getitem__(self, i):
+        values = {name: self.columns[name][i] for name in self.strings}
+        for name, dtype in self.numeric:
+            values[name] = self.columns[name][i].item()
+        return Flight(**values)
+
+    @classmethod
+    def from_feed(cls, answers):
+        # answers is one feed dict or a list of them; a key seen twice is kept once
+        if isinstance(answers, dict):
+            answers = [answers]
+        flights = {}
+        for answer in answers:
+            for key, row in iter_feed(answer):
+                flights[key] = row
+        return cls.from_records(Flight.from_feed(key, row) for key, row in flights.items())
+
+    @classmethod
+    def from_records(cls, records):
+        records = list(records)
+        columns = {}
+        for name, dtype in cls.numeric:
+            columns[name] = np.fromiter((getattr(r, name) or 0 for r in records), dtype=dtype, count=len(records))
+        for name in cls.strings:
+            columns[name] = np.array([intern(getattr(r, name)) for r in records], dtype=object)
+        return cls(columns)
+
+    def filter(self, mask):
+        return FlightBatch({name: column[mask] for name, column in self.columns.items()})
+
+    def in_box(self, north, south, west, east):
+        lat = self.columns["lat"]
+        lng = self.columns["lng"]
+        mask = (lat <= north) & (lat >= south)
+        if west <= east:
+            return mask & (lng >= west) & (lng <= east)
+        # The box crosses the antimeridian
+        return mask & ((lng >= west) | (lng <= east))
+
+    def above(self, alt):
+        return self.columns["alt"] > alt
+
+    def below(self, alt):
+        return self.columns["alt"] < alt
+
+    def by_airline(self, icao):
+        return self.columns["airline"] == icao
@@ -1,6 +1,38 @@
 from django import forms
 from django.contrib.auth.models import User
-from data.models import Country, Airport, AircraftType, Aircraft, Airline, Pilot, Steward
+from data.models import Country, Airport, AircraftType, Aircraft, Airline, Pilot, Steward, Crew, FlightRouteLime
+from data.conflicts import find_conflicts
+
+
+class CatalogFilterForm(forms.Form):
+    priority = forms.ChoiceField(label="Направления", required=False,
+                                 choices=(("1", "Популярные"), ("0", "Остальные"), ("", "Все")))
+    country = forms.CharField(label="Страна", required=False, max_length=200)
+    iata = forms.CharField(label="IATA", required=False, max_length=3)
+    icao = forms.CharField(label="ICAO", required=False, max_length=4)
+
+    def __init__(self, data=None, exclude=(), **kwargs):
+        if data is not None and "priority" not in data:
+            # Without a choice the listings show the popular catalog, as before
+            data = data.copy()
+            data["priority"] = "1"
+        super().__init__(data, **kwargs)
+        for name in exclude:
+            del self.fields[name]
+
+    def filter(self, queryset):
+        # Fields that did not validate are left out
+        self.is_valid()
+        data = self.cleaned_data
+        if data.get("priority"):
+            queryset = queryset.filter(priority=data["priority"] == "1")
+        if data.get("country"):
+            queryset = queryset.filter(country__name=data["country"])
+        if data.get("iata"):
+            queryset = queryset.filter(iata_code__startswith=data["iata"].upper())
+        if data.get("icao"):
+            queryset = queryset.filter(icao_code__startswith=data["icao"].upper())
+        return queryset
 
 
 class UserForm(forms.ModelForm):
@@ -19,3 +51,36 @@ class CountryForm(forms.ModelForm):
     class Meta:
         model = Country
         fields = '__all__'
+
+
+class FlightRouteLimeForm(forms.ModelForm):
+    class Meta:
+        model = FlightRouteLime
+        fields = '__all__'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # The choices show Crew.__str__, which reads the captain
+        self.fields["crew"].queryset = Crew.objects.select_related("pic")
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start = cleaned_data.get("from_datetime")
+        end = cleaned_data.get("to_datetime")
+        if start is None or end is None:
+            return cleaned_data
+        if end <= start:
+            raise forms.ValidationError("Время прилета должно быть позже времени вылета")
+
+        flight = FlightRouteLime(pk=self.instance.pk, from_datetime=start, to_datetime=end,
+                                 aircraft=cleaned_data.get("aircraft"), crew=cleaned_data.get("crew"))
+        errors = []
+        for other, kind in find_conflicts(flight):
+            if kind == "aircraft":
+                text = "Самолет уже занят рейсом {} ({} - {})"
+            else:
+                text = "Экипаж уже занят рейсом {} ({} - {})"
+            errors.append(text.format(other.route_id, other.from_datetime, other.to_datetime))
+        if errors:
+            raise forms.ValidationError(errors)
+        return cleaned_data
@@ -0,0 +1,19 @@
+from django.contrib.auth.hashers import make_password
+from concurrent.futures import ProcessPoolExecutor
+import os
+
+# No model imports here: worker processes only need the settings to hash
+
+
+def hash_passwords(passwords, workers=None):
+    # Returns {password: hash}, hashing every distinct password once.
+    # PBKDF2 is CPU bound, so several distinct passwords are spread over a process pool.
+    distinct = list(set(passwords))
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if len(distinct) < 2 or workers < 2:
+        return {p: make_password(p) for p in distinct}
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(distinct))) as pool:
+        hashes = pool.map(make_password, distinct, chunksize=max(1, len(distinct) // (workers * 4)))
+        return dict(zip(distinct, hashes))
@@ -0,0 +1,76 @@
+import bisect
+
+
+class IntervalIndex:
+    # Busy intervals per key (crew, aircraft, ...), kept sorted by start.
+    # Forced intervals may overlap, so a lookup walks back from the insertion point only as far as the
+    # longest interval of the key can reach: O(log n) plus the intervals that really are that close.
+    def __init__(self):
+        self.starts = {}
+        self.intervals = {}
+        self.longest = {}
+
+    def __len__(self):
+        return sum(len(i) for i in self.intervals.values())
+
+    def conflicts(self, key, start, end, exclude=None):
+        # Items of key whose interval overlaps [start, end)
+        starts = self.starts.get(key)
+        if not starts:
+            return []
+        intervals = self.intervals[key]
+        found = []
+        # Nothing starting at or before this ends after start
+        reach = start - self.longest[key]
+        i = bisect.bisect_left(starts, end)
+        while i > 0:
+            i -= 1
+            s, e, item = intervals[i]
+            if s <= reach:
+                break
+            if e > start and item != exclude:
+                found.append(item)
+        return found
+
+    def is_free(self, key, start, end, exclude=None):
+        return not self.conflicts(key, start, end, exclude=exclude)
+
+    def add(self, key, start, end, item=None, force=False):
+        # Returns the conflicting items and stores nothing, unless force is set
+        found = self.conflicts(key, start, end, exclude=item)
+        if found and not force:
+            return found
+        starts = self.starts.setdefault(key, [])
+        i = bisect.bisect_right(starts, start)
+        starts.insert(i, start)
+        self.intervals.setdefault(key, []).insert(i, (start, end, item))
+        if key not in self.longest or end - start > self.longest[key]:
+            self.longest[key] = end - start
+        return found
+
+    def remove(self, key, item):
+        intervals = self.intervals.get(key, [])
+        for i, interval in enumerate(intervals):
+            if interval[2] == item:
+                del intervals[i]
+                del self.starts[key][i]
+                return True
+        return False
+
+    def last_before(self, key, moment):
+        # The interval of key that ends last at or before moment, or None
+        starts = self.starts.get(key)
+        if not starts:
+            return None
+        longest = self.longest[key]
+        found = None
+        i = bisect.bisect_right(starts, moment)
+        while i > 0:
+            i -= 1
+            interval = self.intervals[key][i]
+            if found is not None and interval[0] + longest <= found[1]:
+                # Nothing starting this early ends later than found
+                break
+            if interval[1] <= moment and (found is None or interval[1] > found[1]):
+                found = interval
+        return found
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from data.rotation import TailAssigner
+import datetime
+
+
+class Command(BaseCommand):
+    help = "Builds aircraft rotations for the flights of a week and lists the flights left without an aircraft"
+
+    def add_arguments(self, parser):
+        parser.add_argument("start", type=datetime.date.fromisoformat, help="YYYY-MM-DD")
+        parser.add_argument("--days", type=int, default=7)
+        parser.add_argument("--reassign", action="store_true", help="Also replace aircraft that are already set")
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        plan = TailAssigner().assign_week(options["start"], days=options["days"], reassign=options["reassign"])
+        if not options["dry_run"]:
+            plan.apply()
+        for flight, reason in plan.unassigned:
+            self.stdout.write("{} {} {}: {}".format(flight.route, flight.from_datetime, flight.id, reason))
+        self.stdout.write("Assigned {} flights to {} aircraft, unassigned {}".format(
+            len(plan.assignments), len(plan.rotations()), len(plan.unassigned)))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from data.crewing import CrewAssigner
+import datetime
+
+
+class Command(BaseCommand):
+    help = "Assigns crews to the flights of a day and lists the flights left without one"
+
+    def add_arguments(self, parser):
+        parser.add_argument("date", type=datetime.date.fromisoformat, help="YYYY-MM-DD")
+        parser.add_argument("--reassign", action="store_true", help="Also replace crews that are already set")
+        parser.add_argument("--min-rest", type=int, default=None, help="Minutes between two flights of a crew")
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        plan = CrewAssigner(min_rest=options["min_rest"]).assign_day(options["date"], reassign=options["reassign"])
+        if not options["dry_run"]:
+            plan.apply()
+        for flight, reason in plan.unassigned:
+            self.stdout.write("{} {} {}: {}".format(flight.route, flight.from_datetime, flight.id, reason))
+        self.stdout.write("Assigned {}, unassigned {}".format(len(plan.assignments), len(plan.unassigned)))
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from data.engine import FR24
+from data.replay import ReplayServer
+from data.world import WorldBuilder, presets
+import datetime
+
+
+class Command(BaseCommand):
+    help = "Fills the database with a synthetic world: airlines, fleets, crews, routes and flights"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--preset", choices=sorted(presets), default="small")
+        parser.add_argument("--seed", type=int, default=None)
+        parser.add_argument("--start", type=datetime.date.fromisoformat, default=None,
+                            help="First day of flights, YYYY-MM-DD (today by default)")
+        parser.add_argument("--fixtures", default=None,
+                            help="Take the FR24 catalogs from fixtures recorded by fr24_record instead of the live site")
+        for size in sorted(presets["small"]):
+            parser.add_argument("--" + size, type=int, default=None, help="Override the preset")
+
+    def handle(self, *args, **options):
+        sizes = {size: options[size] for size in presets["small"]}
+        builder = WorldBuilder(preset=options["preset"], seed=options["seed"], start=options["start"],
+                               log=self.stdout.write, **sizes)
+
+        server = None
+        if options["fixtures"]:
+            server = ReplayServer(options["fixtures"])
+            server.start()
+        try:
+            url = server.url if server else None
+            # No disk cache, so live catalogs never mix with the recorded ones
+            with FR24(base_url=url, api_url=url, cache_dir="" if server else None) as fr24:
+                total = builder.build(fr24)
+        finally:
+            if server:
+                server.shutdown()
+                server.server_close()
+
+        self.stdout.write(", ".join("{} {}".format(v, k) for k, v in total.items()))
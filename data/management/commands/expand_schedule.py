@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from data.schedule import expand_schedule
+import datetime
+
+
+class Command(BaseCommand):
+    help = "Creates the dated flights of every regular route between two dates, skipping the ones that exist"
+
+    def add_arguments(self, parser):
+        parser.add_argument("start", type=datetime.date.fromisoformat, help="YYYY-MM-DD")
+        parser.add_argument("end", type=datetime.date.fromisoformat, help="YYYY-MM-DD, included")
+        parser.add_argument("--all", action="store_true", help="Also expand non-regular routes")
+
+    def handle(self, *args, **options):
+        count = expand_schedule(options["start"], options["end"], regular_only=not options["all"])
+        self.stdout.write("Created {} flights".format(count))
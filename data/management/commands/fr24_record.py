@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from data.engine import FR24
+from data.resilience import FR24Error
+from data.tiling import ZoneTiler
+
+
+class Command(BaseCommand):
+    help = "Records live FR24 answers (catalogs, feed batches, zone tiles) as fixtures for fr24_replay"
+
+    def add_arguments(self, parser):
+        parser.add_argument("directory")
+        parser.add_argument("--zones", action="store_true", help="Also record one cycle of zone tiles")
+        parser.add_argument("--flights", type=int, default=20, help="Flight details to record from the feed")
+
+    def handle(self, *args, **options):
+        # A throwaway catalog cache, so the catalogs are really downloaded and recorded
+        with FR24(record_dir=options["directory"], cache_dir="", cache_ttl=0) as fr24:
+            fr24.get_airports()
+            fr24.get_airlines()
+            flights = fr24.get_flights()
+            if options["zones"]:
+                ZoneTiler(fr24).get_flights()
+            for key, row in flights[:options["flights"]]:
+                try:
+                    fr24.get_flight(key)
+                except FR24Error as e:
+                    # A flight that has just landed has no details any more, the rest are still worth recording
+                    self.stderr.write("Skipped flight {}: {}".format(key, e))
+
+        self.stdout.write("Recorded {} flights into {}".format(len(flights), options["directory"]))
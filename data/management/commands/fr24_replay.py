@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from data.engine import FR24
+from data.replay import ReplayServer
+
+
+class Command(BaseCommand):
+    help = "Serves recorded FR24 fixtures; point FR24_BASE_URL and FR24_API_URL at it"
+
+    def add_arguments(self, parser):
+        parser.add_argument("directory")
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8024)
+        parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every answer")
+        parser.add_argument("--jitter", type=float, default=0.0, help="Random extra latency, seconds")
+        parser.add_argument("--error-rate", type=float, default=0.0, help="Share of answers replaced by 503")
+        parser.add_argument("--scale", type=int, default=1, help="Multiply the number of flights in the feed")
+        parser.add_argument("--verbose-log", action="store_true")
+
+    def handle(self, *args, **options):
+        server = ReplayServer(
+            options["directory"],
+            host=options["host"],
+            port=options["port"],
+            latency=options["latency"],
+            jitter=options["jitter"],
+            error_rate=options["error_rate"],
+            scale=options["scale"],
+            feed_paths=(FR24.dynamic_data["radar"],),
+            verbose=options["verbose_log"],
+        )
+        self.stdout.write("Replaying {} at {}".format(options["directory"], server.url))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
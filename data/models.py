@@ -35,6 +35,10 @@ class Country(models.Model):
         verbose_name = "Страна"
         verbose_name_plural = "Страны"
         ordering = ["-priority", "name"]
+        indexes = [
+            # Keyset pagination in the ordering above (data.pagination)
+            models.Index(fields=["-priority", "name"]),
+        ]
 
 
 class Airport(models.Model):
@@ -55,11 +59,18 @@ class Airport(models.Model):
         verbose_name = "Аэропорт"
         verbose_name_plural = "Аэропорты"
         ordering = ["-priority", "name"]
+        indexes = [
+            # Keyset pagination in the ordering above (data.pagination)
+            models.Index(fields=["-priority", "name"]),
+            # Listings of one country (data.views.show_catalog); IATA/ICAO prefixes use the unique code indexes
+            models.Index(fields=["country", "-priority", "name"]),
+        ]
 
 
 class AircraftType(models.Model):
     model = models.CharField(verbose_name="Название", max_length=200, unique=True)
     icao_code = models.CharField(verbose_name="Код ICAO", max_length=4, unique=True)
+    turnaround = models.PositiveIntegerField(verbose_name="Минимальное время разворота, мин", default=45)
     priority = models.BooleanField(verbose_name="Приоритет", default=False)
 
     def __str__(self):
@@ -87,6 +98,10 @@ class Airline(models.Model):
         verbose_name = "Авиакомпания"
         verbose_name_plural = "Авиакомпании"
         ordering = ["-priority", "name"]
+        indexes = [
+            # Keyset pagination in the ordering above (data.pagination)
+            models.Index(fields=["-priority", "name"]),
+        ]
 
 
 class Aircraft(models.Model):
@@ -190,13 +205,20 @@ class FlightRouteLime(models.Model):
     route = models.ForeignKey(Route, on_delete=models.CASCADE, verbose_name="Маршрут")
     from_datetime = models.DateTimeField(verbose_name="Ориентировочное время вылета")
     to_datetime = models.DateTimeField(verbose_name="Ориентировочное время прилета")
-    actual_from_datetime = models.DateTimeField(verbose_name="Фактическое время вылета")
-    actual_to_datetime = models.DateTimeField(verbose_name="Фактическое время прилета")
-    crew = models.ForeignKey(Crew, on_delete=models.CASCADE, verbose_name="Персонал")
-    aircraft = models.ForeignKey(Aircraft, on_delete=models.CASCADE, verbose_name="Самолет")
+    # Empty until the flight has flown / crew and aircraft are assigned (see data.schedule)
+    actual_from_datetime = models.DateTimeField(verbose_name="Фактическое время вылета", null=True, blank=True)
+    actual_to_datetime = models.DateTimeField(verbose_name="Фактическое время прилета", null=True, blank=True)
+    crew = models.ForeignKey(Crew, on_delete=models.CASCADE, verbose_name="Персонал", null=True, blank=True)
+    aircraft = models.ForeignKey(Aircraft, on_delete=models.CASCADE, verbose_name="Самолет", null=True, blank=True)
 
     class Meta:
         verbose_name = "Рейс"
         verbose_name_plural = "Рейсы"
         ordering = ["route"]
+        indexes = [
+            models.Index(fields=["route", "from_datetime"]),
+            # Overlap checks for double bookings (data.conflicts)
+            models.Index(fields=["aircraft", "from_datetime"]),
+            models.Index(fields=["crew", "from_datetime"]),
+        ]
 
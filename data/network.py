@@ -0,0 +1,284 @@
+from data.models import Airport, Route, FlightRouteLime
+from data.schedule import schedule_times
+from data.spatial import haversine
+from django.conf import settings
+import numpy as np
+import datetime
+import bisect
+import heapq
+import weakref
+
+utc = datetime.timezone.utc
+
+# Networks built from the schedule that follow route changes (see data.signals)
+watched = weakref.WeakSet()
+
+
+def timestamp(moment):
+    if isinstance(moment, datetime.datetime):
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=utc)
+        return int(moment.timestamp())
+    return int(moment)
+
+
+def to_datetime(seconds):
+    return datetime.datetime.fromtimestamp(seconds, tz=utc)
+
+
+class Journey:
+    def __init__(self, legs, distances):
+        # legs are (route id, from airport id, to airport id, departure, arrival) with datetimes
+        self.legs = legs
+        self.distance = sum(distances)
+
+    def __len__(self):
+        return len(self.legs)
+
+    def __repr__(self):
+        return "<Journey {} legs, {:.0f} km>".format(len(self.legs), self.distance)
+
+    @property
+    def departure(self):
+        return self.legs[0][3]
+
+    @property
+    def arrival(self):
+        return self.legs[-1][4]
+
+    @property
+    def transfers(self):
+        return len(self.legs) - 1
+
+    @property
+    def airports(self):
+        return [self.legs[0][1]] + [leg[2] for leg in self.legs]
+
+
+class RouteNetwork:
+    # Time-expanded route network: every dated departure is a connection
+    # (departure, arrival, from airport, to airport, route id), kept sorted by departure for connection scanning.
+    def __init__(self, min_connection=None):
+        if min_connection is None:
+            min_connection = getattr(settings, "MIN_CONNECTION_TIME", 60)
+        # Minutes needed to change flights at an airport
+        self.transfer = min_connection * 60
+        self.connections = []
+        self.routes = {}
+        self.positions = {}
+        self.start = None
+        self.end = None
+        self.dirty = True
+
+    def __len__(self):
+        return len(self.connections)
+
+    @classmethod
+    def from_schedule(cls, start, days=7, routes=None, min_connection=None, watch=True):
+        # Connections of the routes flying from start for days; with watch the network follows route changes
+        network = cls(min_connection=min_connection)
+        network.start = start
+        network.end = start + datetime.timedelta(days=days - 1)
+        if routes is None:
+            routes = Route.objects.filter(is_regular=True).order_by("id")
+        network.update_routes(routes)
+        if watch:
+            watched.add(network)
+        return network
+
+    @classmethod
+    def from_flights(cls, flights=None, min_connection=None):
+        # Connections of dated flights, e.g. FlightRouteLime.objects.filter(from_datetime__gte=...)
+        network = cls(min_connection=min_connection)
+        if flights is None:
+            flights = FlightRouteLime.objects.all()
+        rows = list(flights.order_by().values_list("route_id", "route__from_airport_id", "route__to_airport_id",
+                                                   "from_datetime", "to_datetime"))
+        network.load_airports({row[1] for row in rows} | {row[2] for row in rows})
+        connections = [(timestamp(f), timestamp(t), a, b, route_id) for route_id, a, b, f, t in rows]
+        for route_id, a, b, f, t in rows:
+            network.routes[route_id] = (a, b)
+        network.merge(connections)
+        return network
+
+    def load_airports(self, ids):
+        missing = set(ids) - set(self.positions)
+        if missing:
+            for pk, lat, lng in Airport.objects.filter(id__in=missing).values_list("id", "lat", "lng"):
+                self.positions[pk] = (lat, lng)
+
+    def distances(self, route_ids):
+        # Great-circle length of the routes, km
+        pairs = [self.routes[r] for r in route_ids]
+        if not pairs:
+            return []
+        origin = np.array([self.positions.get(a, (np.nan, np.nan)) for a, b in pairs], dtype=np.float64)
+        target = np.array([self.positions.get(b, (np.nan, np.nan)) for a, b in pairs], dtype=np.float64)
+        return haversine(origin[:, 0], origin[:, 1], target[:, 0], target[:, 1]).tolist()
+
+    def merge(self, connections, removed=()):
+        # Drops the connections of the removed routes and merges the new ones in: O(n), no full re-sort
+        removed = set(removed)
+        kept = [c for c in self.connections if c[4] not in removed] if removed else self.connections
+        self.connections = list(heapq.merge(kept, sorted(connections)))
+        self.dirty = True
+
+    def update_routes(self, routes):
+        # (Re)builds the connections of the given routes only
+        routes = list(routes)
+        if self.start is None:
+            raise ValueError("Only a network built from the schedule follows route changes")
+        route_index, departures, arrivals = schedule_times(routes, self.start, self.end)
+        self.load_airports({r.from_airport_id for r in routes} | {r.to_airport_id for r in routes})
+        for r in routes:
+            self.routes[r.id] = (r.from_airport_id, r.to_airport_id)
+        connections = [(f, t, routes[i].from_airport_id, routes[i].to_airport_id, routes[i].id)
+                       for i, f, t in zip(route_index.tolist(), departures.tolist(), arrivals.tolist())]
+        self.merge(connections, removed={r.id for r in routes})
+
+    def remove_routes(self, route_ids):
+        route_ids = set(route_ids)
+        for r in route_ids:
+            self.routes.pop(r, None)
+        self.merge([], removed=route_ids)
+
+    def compile(self):
+        # Parallel lists are much faster to scan from python than a list of tuples
+        if self.dirty:
+            self.departures = [c[0] for c in self.connections]
+            self.arrivals = [c[1] for c in self.connections]
+            self.origins = [c[2] for c in self.connections]
+            self.targets = [c[3] for c in self.connections]
+            self.dirty = False
+
+    def journey(self, entered, destination):
+        legs = []
+        airport = destination
+        while airport in entered:
+            i = entered[airport]
+            f, t, a, b, route_id = self.connections[i]
+            legs.append((route_id, a, b, to_datetime(f), to_datetime(t)))
+            airport = a
+        legs.reverse()
+        return Journey(legs, self.distances([leg[0] for leg in legs]))
+
+    def earliest_arrival(self, origin, destination, departure, horizon=None):
+        # Connection scan: one pass over the connections from departure on, stopping as soon as
+        # no later departure can improve the arrival at destination. Returns a Journey or None.
+        self.compile()
+        origin = getattr(origin, "pk", origin)
+        destination = getattr(destination, "pk", destination)
+        start = timestamp(departure)
+        stop = start + int(horizon.total_seconds()) if horizon is not None else None
+        # ready: when a passenger can board at the airport (arrival plus the transfer time)
+        ready = {origin: start}
+        entered = {}
+        best = None
+        departures, arrivals, origins, targets = self.departures, self.arrivals, self.origins, self.targets
+        transfer = self.transfer
+        for i in range(bisect.bisect_left(departures, start), len(departures)):
+            f = departures[i]
+            if (best is not None and f >= best) or (stop is not None and f > stop):
+                break
+            a = origins[i]
+            if a not in ready or ready[a] > f:
+                continue
+            b = targets[i]
+            t = arrivals[i]
+            if b == destination:
+                if best is None or t < best:
+                    best = t
+                    entered[b] = i
+            elif b != origin and t + transfer < ready.get(b, t + transfer + 1):
+                ready[b] = t + transfer
+                entered[b] = i
+        if best is None:
+            return None
+        return self.journey(entered, destination)
+
+    def fewest_connections(self, origin, destination, departure, max_legs=4, horizon=None):
+        # Round k finds everything reachable with k legs (scanning from the round k - 1 arrivals),
+        # so the first round reaching destination has the fewest legs; among those the earliest arrival wins.
+        self.compile()
+        origin = getattr(origin, "pk", origin)
+        destination = getattr(destination, "pk", destination)
+        start = timestamp(departure)
+        stop = start + int(horizon.total_seconds()) if horizon is not None else None
+        first = bisect.bisect_left(self.departures, start)
+        departures, arrivals, origins, targets = self.departures, self.arrivals, self.origins, self.targets
+        transfer = self.transfer
+
+        ready = {origin: start}
+        entered = [{}]
+        for k in range(max_legs):
+            reached = {}
+            entries = {}
+            best = None
+            for i in range(first, len(departures)):
+                f = departures[i]
+                if (best is not None and f >= best) or (stop is not None and f > stop):
+                    break
+                a = origins[i]
+                if a not in ready or ready[a] > f:
+                    continue
+                b = targets[i]
+                t = arrivals[i]
+                if b == destination:
+                    if best is None or t < best:
+                        best = t
+                        entries[b] = i
+                elif b != origin and t + transfer < reached.get(b, ready.get(b, t + transfer + 1)):
+                    reached[b] = t + transfer
+                    entries[b] = i
+            entered.append(entries)
+            if best is not None:
+                return self.rounds_journey(entered, destination)
+            if not reached:
+                return None
+            ready.update(reached)
+        return None
+
+    def rounds_journey(self, entered, destination):
+        legs = []
+        airport = destination
+        k = len(entered) - 1
+        while k > 0:
+            f, t, a, b, route_id = self.connections[entered[k][airport]]
+            legs.append((route_id, a, b, to_datetime(f), to_datetime(t)))
+            airport = a
+            # The leg into a is the one of the last round before k that improved a (the origin is in none)
+            k -= 1
+            while k > 0 and airport not in entered[k]:
+                k -= 1
+        legs.reverse()
+        return Journey(legs, self.distances([leg[0] for leg in legs]))
+
+    def shortest_path(self, origin, destination):
+        # Dijkstra over the routes by great-circle distance, ignoring times: (km, [airport ids]) or None
+        origin = getattr(origin, "pk", origin)
+        destination = getattr(destination, "pk", destination)
+        edges = {}
+        route_ids = list(self.routes)
+        for route_id, km in zip(route_ids, self.distances(route_ids)):
+            a, b = self.routes[route_id]
+            if km < edges.setdefault(a, {}).get(b, float("inf")):
+                edges[a][b] = km
+        distance = {origin: 0.0}
+        previous = {}
+        heap = [(0.0, origin)]
+        while heap:
+            d, a = heapq.heappop(heap)
+            if a == destination:
+                path = [a]
+                while a in previous:
+                    a = previous[a]
+                    path.append(a)
+                return d, path[::-1]
+            if d > distance[a]:
+                continue
+            for b, km in edges.get(a, {}).items():
+                if d + km < distance.get(b, float("inf")):
+                    distance[b] = d + km
+                    previous[b] = a
+                    heapq.heappush(heap, (d + km, b))
+        return None
@@ -0,0 +1,60 @@
+from django.conf import settings
+from django.db.models import Q
+import base64
+import json
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def page_size():
+    return getattr(settings, "CATALOG_PAGE_SIZE", 60)
+
+
+def encode_cursor(obj):
+    # The position after obj in the ("-priority", "name") order; names are unique so it is exact
+    raw = json.dumps([obj.priority, obj.name], ensure_ascii=False).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        priority, name = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise InvalidCursor(cursor)
+    if not isinstance(priority, bool) or not isinstance(name, str):
+        raise InvalidCursor(cursor)
+    return priority, name
+
+
+class KeysetPage:
+    def __init__(self, items, next_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def keyset_page(queryset, cursor=None, size=None):
+    # One page of queryset in ("-priority", "name") order starting after cursor. Unlike OFFSET the database
+    # seeks straight to the cursor in the (-priority, name) index, so every page costs the same.
+    size = size or page_size()
+    queryset = queryset.order_by("-priority", "name")
+    if cursor:
+        priority, name = decode_cursor(cursor)
+        after = Q(priority=priority, name__gt=name)
+        if priority:
+            after |= Q(priority=False)
+        queryset = queryset.filter(after)
+    items = list(queryset[:size + 1])
+    next_cursor = encode_cursor(items[size - 1]) if len(items) > size else None
+    return KeysetPage(items[:size], next_cursor)
@@ -0,0 +1,83 @@
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+import threading
+import time
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+        self.queued = 0
+        self.sent = 0
+        self.throttled = 0
+        self.waited = 0.0
+
+    def reserve(self):
+        # Takes a token and returns how long the caller has to wait before using it.
+        # Tokens can go below zero: later callers queue up behind the earlier ones.
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            self.sent += 1
+            if self.tokens >= 0:
+                return 0.0
+            delay = -self.tokens / self.rate
+            self.queued += 1
+            self.waited += delay
+            return delay
+
+    def acquire(self):
+        delay = self.reserve()
+        if delay:
+            time.sleep(delay)
+
+    def record_throttled(self):
+        # The server answered 429 although we kept to the limit
+        with self.lock:
+            self.throttled += 1
+
+    def metrics(self):
+        return {
+            "rate": self.rate,
+            "burst": self.burst,
+            "queued": self.queued,
+            "sent": self.sent,
+            "throttled": self.throttled,
+            "waited": round(self.waited, 3),
+        }
+
+
+# One bucket per endpoint group for the whole process, every client shares them
+limiters = {}
+limiters_lock = threading.Lock()
+
+
+def get_limiter(group):
+    with limiters_lock:
+        if group not in limiters:
+            limits = getattr(settings, "FR24_RATE_LIMITS", {})
+            rate, burst = limits.get(group, (10, 20))
+            limiters[group] = TokenBucket(rate, burst)
+        return limiters[group]
+
+
+def get_metrics():
+    return {group: limiter.metrics() for group, limiter in limiters.items()}
+
+
+class ThrottledAdapter(HTTPAdapter):
+    # Waits for a token before each request; group(url) names the bucket
+    def __init__(self, group, *args, **kwargs):
+        self.group = group
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, *args, **kwargs):
+        get_limiter(self.group(request.url)).acquire()
+        return super().send(request, *args, **kwargs)
@@ -0,0 +1,169 @@
+from data.flights import stop_words
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl, urlencode
+import threading
+import hashlib
+import random
+import zlib
+import gzip
+import json
+import time
+import io
+import os
+
+
+def fixture_name(path, query):
+    # query is a list of (key, value) pairs, the order of parameters does not matter
+    query = urlencode(sorted(query))
+    digest = hashlib.sha1((path + "?" + query).encode("utf-8")).hexdigest()[:16]
+    return path.strip("/").replace("/", "_") or "index", digest
+
+
+class Recorder:
+    # Response hook for a requests session: every answer is saved as <dir>/<path>/<hash>.json.gz
+    def __init__(self, directory):
+        self.directory = directory
+        self.lock = threading.Lock()
+
+    def hook(self, response, *args, **kwargs):
+        if response.status_code != 200:
+            return response
+        parts = urlsplit(response.url)
+        query = parse_qsl(parts.query, keep_blank_values=True)
+        folder, name = fixture_name(parts.path, query)
+
+        content = response.content
+        # The body is consumed now, streaming callers read it back from memory
+        response.raw = io.BytesIO(content)
+        fixture = {
+            "url": response.url,
+            "path": parts.path,
+            "query": query,
+            "content_type": response.headers.get("Content-Type", "application/json"),
+            "body": content.decode(response.encoding or "utf-8"),
+        }
+
+        with self.lock:
+            os.makedirs(os.path.join(self.directory, folder), exist_ok=True)
+            with gzip.open(os.path.join(self.directory, folder, name + ".json.gz"), "wt", encoding="utf-8") as f:
+                json.dump(fixture, f)
+        return response
+
+
+class FixtureStore:
+    def __init__(self, directory):
+        self.directory = directory
+        self.exact = {}
+        self.by_path = {}
+        for folder in sorted(os.listdir(directory)):
+            path = os.path.join(directory, folder)
+            if not os.path.isdir(path):
+                continue
+            for filename in sorted(os.listdir(path)):
+                if not filename.endswith(".json.gz"):
+                    continue
+                with gzip.open(os.path.join(path, filename), "rt", encoding="utf-8") as f:
+                    fixture = json.load(f)
+                fixture["body"] = fixture["body"].encode("utf-8")
+                fixture["etag"] = '"{}"'.format(hashlib.sha1(fixture["body"]).hexdigest())
+                self.exact[(folder, filename[:-8])] = fixture
+                self.by_path.setdefault(fixture["path"], []).append(fixture)
+
+    def find(self, path, query):
+        fixture = self.exact.get(fixture_name(path, query))
+        if fixture is None:
+            # Unknown parameters (other bounds, other airline): answer with any recording of the endpoint
+            candidates = self.by_path.get(path)
+            if candidates:
+                fixture = candidates[zlib.crc32(urlencode(sorted(query)).encode("utf-8")) % len(candidates)]
+        return fixture
+
+
+def scale_feed(body, scale, seed=0):
+    # Adds scale - 1 synthetic copies of every flight, moved a little so they are distinct
+    answer = json.loads(body)
+    rnd = random.Random(seed)
+    flights = [(key, answer[key]) for key in answer if key not in stop_words and isinstance(answer[key], list)]
+    for copy in range(1, scale):
+        for key, row in flights:
+            row = list(row)
+            row[1] = max(-90.0, min(90.0, row[1] + rnd.uniform(-1, 1)))
+            row[2] = (row[2] + rnd.uniform(-1, 1) + 180) % 360 - 180
+            answer["{}-{}".format(key, copy)] = row
+    if "full_count" in answer:
+        answer["full_count"] = answer["full_count"] * scale
+    return json.dumps(answer).encode("utf-8")
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def send_body(self, status, body, content_type, headers=None):
+        if "gzip" in self.headers.get("Accept-Encoding", "") and body:
+            body = gzip.compress(body, compresslevel=1)
+            headers = dict(headers or {}, **{"Content-Encoding": "gzip"})
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        if server.latency or server.jitter:
+            time.sleep(server.latency + random.uniform(0, server.jitter))
+
+        if server.error_rate and random.random() < server.error_rate:
+            self.send_body(503, b"", "text/plain", {"Retry-After": "1"})
+            return
+
+        parts = urlsplit(self.path)
+        query = parse_qsl(parts.query, keep_blank_values=True)
+        fixture = server.store.find(parts.path, query)
+        if fixture is None:
+            self.send_body(404, b"", "text/plain")
+            return
+
+        if self.headers.get("If-None-Match") == fixture["etag"]:
+            self.send_response(304)
+            self.send_header("ETag", fixture["etag"])
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        body = fixture["body"]
+        if server.scale > 1 and parts.path in server.feed_paths:
+            body = scale_feed(body, server.scale)
+        self.send_body(200, body, fixture["content_type"], {"ETag": fixture["etag"]})
+
+
+class ReplayServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, directory, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, error_rate=0.0, scale=1,
+                 feed_paths=("/zones/fcgi/feed.js",), verbose=False):
+        self.store = FixtureStore(directory)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.scale = scale
+        self.feed_paths = feed_paths
+        self.verbose = verbose
+        super().__init__((host, port), ReplayHandler)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return "http://{}:{}".format(host, port)
+
+    def start(self):
+        # Serve from a background thread, handy in benchmarks and tests
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,111 @@
+from email.utils import parsedate_to_datetime
+import threading
+import datetime
+import random
+import time
+
+
+class FR24Error(Exception):
+    retry_after = None
+    retryable = False
+
+
+class FR24HTTPError(FR24Error):
+    def __init__(self, url, status_code, retry_after=None):
+        self.url = url
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.retryable = status_code in RetryPolicy.retry_statuses
+        super().__init__("Error 1. Server return request with {} code: {}".format(status_code, url))
+
+
+class FR24ConnectionError(FR24Error):
+    retryable = True
+
+    def __init__(self, url, error):
+        self.url = url
+        self.error = error
+        super().__init__("Error 2. Request failed: {} ({})".format(url, error))
+
+
+class CircuitOpenError(FR24Error):
+    def __init__(self, endpoint, retry_after):
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+        super().__init__("Error 3. Endpoint {} is failing, next try in {:.0f} s".format(endpoint, retry_after))
+
+
+def parse_retry_after(value):
+    # Retry-After is either a number of seconds or an HTTP date
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        # "-0000" means UTC with no zone information: parsedate_to_datetime returns a naive datetime
+        date = date.replace(tzinfo=datetime.timezone.utc)
+    return max(0.0, (date - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+
+class RetryPolicy:
+    retry_statuses = (429, 500, 502, 503, 504)
+
+    def __init__(self, attempts=4, backoff=0.5, max_backoff=30):
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    def delay(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return min(retry_after, self.max_backoff)
+        # Exponential backoff with full jitter, so parallel clients do not retry in step
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+
+class CircuitBreaker:
+    def __init__(self, endpoint, failures=5, reset_timeout=30):
+        self.endpoint = endpoint
+        self.failures = failures
+        self.reset_timeout = reset_timeout
+        self.lock = threading.Lock()
+        self.count = 0
+        self.opened_at = None
+
+    def before_request(self):
+        with self.lock:
+            if self.opened_at is None:
+                return
+            wait = self.opened_at + self.reset_timeout - time.monotonic()
+            if wait > 0:
+                raise CircuitOpenError(self.endpoint, wait)
+            # Half-open: let this request through, one more failure opens the circuit again
+            self.opened_at = None
+            self.count = self.failures - 1
+
+    def record_success(self):
+        with self.lock:
+            self.count = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self.lock:
+            self.count += 1
+            if self.count >= self.failures:
+                self.opened_at = time.monotonic()
+
+
+class BatchResult(list):
+    # Answers in the order of the requests, None where a request failed; errors maps index -> exception
+    def __init__(self, answers=(), errors=None):
+        super().__init__(answers)
+        self.errors = errors if errors is not None else {}
+
+    @property
+    def complete(self):
+        return not self.errors
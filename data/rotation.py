@@ -0,0 +1,140 @@
+from data.models import Aircraft, FlightRouteLime
+from data.intervals import IntervalIndex
+from data.conflicts import bookings, with_last_arrival
+from django.db import transaction
+import datetime
+import heapq
+
+# Rows per UPDATE statement
+batch_size = 1000
+
+
+class RotationPlan:
+    def __init__(self):
+        self.assignments = {}
+        # (flight, reason) for every flight no aircraft could take
+        self.unassigned = []
+        # Flights that lose their aircraft: reassigned, but no aircraft could take them
+        self.released = []
+
+    def rotations(self):
+        # aircraft -> its flights in order
+        result = {}
+        for flight, aircraft in self.assignments.values():
+            result.setdefault(aircraft, []).append(flight)
+        for flights in result.values():
+            flights.sort(key=lambda f: f.from_datetime)
+        return result
+
+    def apply(self):
+        flights = []
+        for flight, aircraft in self.assignments.values():
+            flight.aircraft = aircraft
+            flights.append(flight)
+        for flight in self.released:
+            # The planner has given the old aircraft to other flights
+            flight.aircraft = None
+            flights.append(flight)
+        with transaction.atomic():
+            FlightRouteLime.objects.bulk_update(flights, ["aircraft"], batch_size=batch_size)
+        return len(flights)
+
+
+class TailAssigner:
+    # Sorted sweep over departures: every flight takes the aircraft of its airline that has waited longest
+    # at the departure airport, and the aircraft becomes ready at the arrival airport after the minimum
+    # turnaround of its type. Each step is a heap operation, so a week of flights costs O(n log n).
+
+    def week_flights(self, start, days=7):
+        window_start = datetime.datetime.combine(start, datetime.time(), tzinfo=datetime.timezone.utc)
+        window_end = window_start + datetime.timedelta(days=days)
+        return list(FlightRouteLime.objects.filter(from_datetime__gte=window_start, from_datetime__lt=window_end)
+                    .select_related("route").order_by("from_datetime", "id"))
+
+    def assign_week(self, start, days=7, reassign=False):
+        return self.assign(self.week_flights(start, days=days), reassign=reassign)
+
+    def assign(self, flights, reassign=False):
+        plan = RotationPlan()
+        if not flights:
+            return plan
+        start = min(f.from_datetime for f in flights)
+        end = max(f.to_datetime for f in flights)
+        airline_ids = {f.route.airline_id for f in flights}
+        fleet = {a.id: a for a in with_last_arrival(Aircraft.objects.filter(airline__in=airline_ids, status=True),
+                                                    "aircraft", start).select_related("model")}
+
+        # (airline, airport) -> heap of (ready from, aircraft id). Every aircraft starts where its last flight
+        # before the window landed, or at its hub.
+        pools = {}
+        never = datetime.datetime.min.replace(tzinfo=datetime.timezone.utc)
+        for a in fleet.values():
+            if a.last_airport is not None:
+                a.location = a.last_airport
+                ready = a.last_arrival + self.turnaround(a)
+            else:
+                a.location = a.hub_id
+                ready = never
+            heapq.heappush(pools.setdefault((a.airline_id, a.location), []), (ready, a.id))
+
+        # Booked flights per aircraft, turnaround included; items are (flight id, arrival airport).
+        # Flights outside the batch that reach into it (say, an overnight one of the day before) are booked too.
+        busy = IntervalIndex()
+        margin = max((self.turnaround(a) for a in fleet.values()), default=datetime.timedelta())
+        for aircraft_id, *booking in bookings("aircraft", start - margin, end + margin,
+                                              exclude=[f.id for f in flights]):
+            if aircraft_id in fleet:
+                self.book(busy, pools, fleet[aircraft_id], *booking)
+        todo = []
+        for f in flights:
+            if f.aircraft_id is not None and not reassign:
+                if f.aircraft_id in fleet:
+                    self.book(busy, pools, fleet[f.aircraft_id], f.id, f.from_datetime, f.to_datetime,
+                              f.route.to_airport_id)
+                else:
+                    plan.unassigned.append((f, "the aircraft is inactive or not in the airline fleet"))
+            else:
+                todo.append(f)
+
+        for f in sorted(todo, key=lambda x: (x.from_datetime, x.id)):
+            pool = pools.get((f.route.airline_id, f.route.from_airport_id), [])
+            aircraft = self.take(pool, f, fleet, busy)
+            if aircraft is None:
+                plan.unassigned.append((f, "no aircraft ready at the departure airport"))
+                if f.aircraft_id is not None:
+                    plan.released.append(f)
+                continue
+            plan.assignments[f.id] = (f, aircraft)
+            self.book(busy, pools, aircraft, f.id, f.from_datetime, f.to_datetime, f.route.to_airport_id)
+        return plan
+
+    @staticmethod
+    def turnaround(aircraft):
+        return datetime.timedelta(minutes=aircraft.model.turnaround)
+
+    def book(self, busy, pools, aircraft, flight_id, departure, arrival, airport_id):
+        ready = arrival + self.turnaround(aircraft)
+        busy.add(aircraft.id, departure, ready, (flight_id, airport_id), force=True)
+        heapq.heappush(pools.setdefault((aircraft.airline_id, airport_id), []), (ready, aircraft.id))
+
+    def take(self, pool, flight, fleet, busy):
+        skipped = []
+        found = None
+        while pool and pool[0][0] <= flight.from_datetime:
+            entry = heapq.heappop(pool)
+            aircraft = fleet.get(entry[1])
+            if aircraft is None:
+                continue
+            last = busy.last_before(aircraft.id, flight.from_datetime)
+            location = last[2][1] if last else aircraft.location
+            if location != flight.route.from_airport_id:
+                # The aircraft has flown elsewhere since it was put in this pool
+                continue
+            # The aircraft must also be back on the ground before any later booked flight
+            if busy.is_free(aircraft.id, flight.from_datetime, flight.to_datetime + self.turnaround(aircraft)):
+                found = aircraft
+                break
+            skipped.append(entry)
+        for entry in skipped:
+            heapq.heappush(pool, entry)
+        return found
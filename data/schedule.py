@@ -0,0 +1,92 @@
+from data.models import Route, FlightRouteLime
+from django.db import transaction
+import numpy as np
+import datetime
+
+# Rows per INSERT statement
+batch_size = 1000
+
+# days_of_week has one character per day from Monday: "1.3.5.7" or "1010101".
+# These characters mean the route does not fly that day, anything else means it does.
+days_off = "0.- _"
+
+epoch = datetime.date(1970, 1, 1)
+
+
+def days_mask(days_of_week):
+    days = (days_of_week or "").ljust(7)[:7]
+    return [c not in days_off for c in days]
+
+
+def seconds(time):
+    return time.hour * 3600 + time.minute * 60 + time.second
+
+
+def schedule_times(routes, start, end, skip=None):
+    # (route indexes, departures, arrivals) in seconds since the epoch for every day from start to end
+    # (inclusive) the routes fly. skip is a set of (route_id, date) already materialized.
+    routes = list(routes)
+    if not routes or end < start:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty
+
+    masks = np.array([days_mask(r.days_of_week) for r in routes], dtype=bool)
+    departure = np.array([seconds(r.from_scheduled_time) for r in routes], dtype=np.int64)
+    arrival = np.array([seconds(r.to_scheduled_time) for r in routes], dtype=np.int64)
+    # An arrival at or before the departure time of day lands the next day
+    arrival += np.where(arrival <= departure, 86400, 0)
+
+    first = (start - epoch).days
+    days = np.arange(first, (end - epoch).days + 1, dtype=np.int64)
+    weekdays = (days + 3) % 7  # 1970-01-01 was a Thursday, Monday is 0
+
+    route_index, day_index = np.nonzero(masks[:, weekdays])
+    day = days[day_index]
+
+    if skip:
+        ids = np.array([r.id for r in routes], dtype=np.int64)
+        keys = ids[route_index] * 1000000 + day
+        done = np.array([route_id * 1000000 + (date - epoch).days for route_id, date in skip], dtype=np.int64)
+        keep = ~np.isin(keys, done)
+        route_index = route_index[keep]
+        day = day[keep]
+
+    midnight = day * 86400
+    return route_index, midnight + departure[route_index], midnight + arrival[route_index]
+
+
+def plan_flights(routes, start, end, skip=None):
+    # Unsaved FlightRouteLime rows for every day from start to end (inclusive) the routes fly.
+    # skip is a set of (route_id, date) already materialized.
+    routes = list(routes)
+    route_index, departures, arrivals = schedule_times(routes, start, end, skip=skip)
+    from_times = departures.astype("datetime64[s]").tolist()
+    to_times = arrivals.astype("datetime64[s]").tolist()
+
+    utc = datetime.timezone.utc
+    return [
+        FlightRouteLime(route=routes[r], from_datetime=f.replace(tzinfo=utc), to_datetime=t.replace(tzinfo=utc))
+        for r, f, t in zip(route_index.tolist(), from_times, to_times)
+    ]
+
+
+def materialized(start, end):
+    # (route_id, date) pairs that already have a flight in the window
+    window_start = datetime.datetime.combine(start, datetime.time(), tzinfo=datetime.timezone.utc)
+    window_end = datetime.datetime.combine(end + datetime.timedelta(days=1), datetime.time(),
+                                           tzinfo=datetime.timezone.utc)
+    flights = FlightRouteLime.objects.filter(from_datetime__gte=window_start, from_datetime__lt=window_end)
+    return {(route_id, departure.date()) for route_id, departure in flights.values_list("route_id", "from_datetime")}
+
+
+def expand_schedule(start, end, routes=None, regular_only=True):
+    # Creates the missing flights of the window and returns how many were inserted
+    if routes is None:
+        routes = Route.objects.order_by("id")
+        if regular_only:
+            routes = routes.filter(is_regular=True)
+
+    with transaction.atomic():
+        flights = plan_flights(routes, start, end, skip=materialized(start, end))
+        FlightRouteLime.objects.bulk_create(flights, batch_size=batch_size)
+    return len(flights)
@@ -0,0 +1,36 @@
+from data.models import Country, Airport, Airline, Route
+from data import caching, network
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+
+@receiver(post_save, sender=Route)
+def route_saved(sender, instance, **kwargs):
+    for graph in list(network.watched):
+        graph.update_routes([instance])
+
+
+@receiver(post_delete, sender=Route)
+def route_deleted(sender, instance, **kwargs):
+    for graph in list(network.watched):
+        graph.remove_routes([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Country)
+def country_changed(sender, instance, **kwargs):
+    caching.bump("country")
+    caching.forget("one_country", instance)
+    # Airport pages show the country name
+    caching.forget("one_airport", *Airport.objects.filter(country_id=instance.pk).only("id"))
+
+
+@receiver([post_save, post_delete], sender=Airport)
+def airport_changed(sender, instance, **kwargs):
+    caching.bump("airport")
+    caching.forget("one_airport", instance)
+
+
+@receiver([post_save, post_delete], sender=Airline)
+def airline_changed(sender, instance, **kwargs):
+    caching.bump("airline")
+    caching.forget("one_airline", instance)
@@ -0,0 +1,155 @@
+from data.models import Airport
+import numpy as np
+import math
+
+# Mean earth radius, km
+earth_radius = 6371.0088
+
+# Edge of a grid cell, km: airports are bucketed by cubes of this size over unit-sphere coordinates
+cell_size = 100
+
+# An aircraft this close to an airport (km) is at the airport
+near_radius = 10
+
+
+def haversine(lat1, lng1, lat2, lng2):
+    # Great-circle distance in km; any argument may be a numpy array, they broadcast
+    lat1, lng1, lat2, lng2 = (np.radians(np.asarray(x, dtype=np.float64)) for x in (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * earth_radius * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def to_xyz(lat, lng):
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    lng = np.radians(np.asarray(lng, dtype=np.float64))
+    return np.stack([np.cos(lat) * np.cos(lng), np.cos(lat) * np.sin(lng), np.sin(lat)], axis=-1)
+
+
+def chord(km):
+    # Straight-line distance between two points of the unit sphere km apart on the surface
+    return 2 * math.sin(min(km / earth_radius, math.pi) / 2)
+
+
+class AirportIndex:
+    # Grid over the unit sphere: a point and everything within r cells around it covers a ball of radius r * size,
+    # so a query only computes distances to the airports of a few cells.
+    def __init__(self, airports, size=cell_size):
+        self.items = list(airports)
+        # Model airports have lng, FR24.Airport has lon
+        self.lat = np.array([a.lat for a in self.items], dtype=np.float64)
+        self.lng = np.array([a.lng if hasattr(a, "lng") else a.lon for a in self.items], dtype=np.float64)
+        self.size = chord(size)
+
+        keys = np.floor(to_xyz(self.lat, self.lng) / self.size).astype(np.int64).reshape(-1, 3)
+        self.cells = {}
+        for i, key in enumerate(map(tuple, keys.tolist())):
+            self.cells.setdefault(key, []).append(i)
+        self.cells = {key: np.array(ids, dtype=np.int64) for key, ids in self.cells.items()}
+        self.cell_keys = np.array(list(self.cells), dtype=np.int64).reshape(-1, 3)
+        self.cell_ids = list(self.cells.values())
+
+    @classmethod
+    def from_models(cls, airports=None, size=cell_size):
+        if airports is None:
+            airports = Airport.objects.order_by("id")
+        return cls(airports, size=size)
+
+    @classmethod
+    def from_catalog(cls, fr24, size=cell_size):
+        return cls(fr24.airport_catalog(), size=size)
+
+    def __len__(self):
+        return len(self.items)
+
+    def key(self, lat, lng):
+        return tuple(np.floor(to_xyz(lat, lng) / self.size).astype(np.int64).tolist())
+
+    def candidates(self, key, reach):
+        # Indexes of the airports in the cells at most reach cells away from key
+        if (2 * reach + 1) ** 3 <= len(self.cells):
+            found = []
+            x, y, z = key
+            for i in range(x - reach, x + reach + 1):
+                for j in range(y - reach, y + reach + 1):
+                    for k in range(z - reach, z + reach + 1):
+                        ids = self.cells.get((i, j, k))
+                        if ids is not None:
+                            found.append(ids)
+        else:
+            # Wider than the grid itself: scan the occupied cells instead of the empty ones
+            near = np.all(np.abs(self.cell_keys - np.array(key, dtype=np.int64)) <= reach, axis=1)
+            found = [self.cell_ids[i] for i in np.nonzero(near)[0]]
+        if not found:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(found)
+
+    def within(self, lat, lng, radius):
+        # [(airport, km)] within radius km of the point, nearest first
+        reach = int(math.ceil(chord(radius) / self.size))
+        ids = self.candidates(self.key(lat, lng), reach)
+        distances = haversine(lat, lng, self.lat[ids], self.lng[ids])
+        keep = distances <= radius
+        ids, distances = ids[keep], distances[keep]
+        order = np.argsort(distances, kind="stable")
+        return [(self.items[i], d) for i, d in zip(ids[order].tolist(), distances[order].tolist())]
+
+    def nearest(self, lat, lng, n=1):
+        # [(airport, km)] of the n nearest airports, nearest first
+        n = min(n, len(self.items))
+        if n <= 0:
+            return []
+        key = self.key(lat, lng)
+        reach = 1
+        while True:
+            ids = self.candidates(key, reach)
+            if len(ids) >= n:
+                distances = haversine(lat, lng, self.lat[ids], self.lng[ids])
+                order = np.argsort(distances, kind="stable")[:n]
+                # Complete once the n-th one is inside the ball the cells are sure to cover
+                if len(ids) == len(self.items) or chord(distances[order[-1]]) <= reach * self.size:
+                    return [(self.items[i], d) for i, d in zip(ids[order].tolist(), distances[order].tolist())]
+            reach *= 2
+
+    def match(self, lats, lngs, radius=near_radius):
+        # Nearest airport within radius km for every position: (airport indexes, -1 if none; distances, km)
+        lats = np.asarray(lats, dtype=np.float64)
+        lngs = np.asarray(lngs, dtype=np.float64)
+        found = np.full(len(lats), -1, dtype=np.int64)
+        best = np.full(len(lats), np.inf)
+        if not len(lats) or not self.items:
+            return found, best
+
+        reach = int(math.ceil(chord(radius) / self.size))
+        keys = np.floor(to_xyz(lats, lngs) / self.size).astype(np.int64).reshape(-1, 3)
+        # Positions of one cell share their candidates, so distances are computed cell by cell as one matrix
+        cells, inverse = np.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        order = np.argsort(inverse, kind="stable")
+        bounds = np.searchsorted(inverse[order], np.arange(len(cells) + 1))
+        for c, key in enumerate(map(tuple, cells.tolist())):
+            ids = self.candidates(key, reach)
+            if not len(ids):
+                continue
+            points = order[bounds[c]:bounds[c + 1]]
+            distances = haversine(lats[points, None], lngs[points, None], self.lat[ids], self.lng[ids])
+            nearest = np.argmin(distances, axis=1)
+            d = distances[np.arange(len(points)), nearest]
+            hit = d <= radius
+            found[points[hit]] = ids[nearest[hit]]
+            best[points[hit]] = d[hit]
+        return found, best
+
+    def locate(self, flights, radius=near_radius, on_ground=False):
+        # Airport each flight (a FlightBatch or Flight objects) is on or near, or None.
+        # With on_ground only the flights reported on the ground are matched.
+        if hasattr(flights, "columns"):
+            lats, lngs, ground = flights.lat, flights.lng, flights.on_ground
+        else:
+            flights = list(flights)
+            lats = [f.lat for f in flights]
+            lngs = [f.lng for f in flights]
+            ground = np.array([bool(f.on_ground) for f in flights], dtype=bool)
+        found, distances = self.match(lats, lngs, radius=radius)
+        if on_ground:
+            found[~np.asarray(ground, dtype=bool)] = -1
+        return [self.items[i] if i >= 0 else None for i in found.tolist()]
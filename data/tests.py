@@ -1,3 +1,434 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import User
+from django.db import connection
+from data.models import Country, Airport, AircraftType, Aircraft, Airline, Pilot, Steward, Route, Crew, FlightRouteLime
+from data.conflicts import check_flights
+from data.rotation import TailAssigner
+from data.crewing import CrewAssigner
+from data.world import WorldBuilder
+from data.schedule import expand_schedule
+from data.cache import CatalogCache
+from data.resilience import parse_retry_after
+from data import engine
+import datetime
 
-# Create your tests here.
+
+def create_row(i):
+    # One of everything, all linked: the flight of route 100 + i on 2026-01-01 + i days
+    country = Country.objects.create(name="Country {}".format(i), priority=True)
+    hub = Airport.objects.create(name="Hub {}".format(i), iata_code="H{:02d}".format(i),
+                                 icao_code="HH{:02d}".format(i), lat=i, lng=i, country=country, priority=True)
+    airport = Airport.objects.create(name="Airport {}".format(i), iata_code="A{:02d}".format(i),
+                                     icao_code="AA{:02d}".format(i), lat=-i, lng=-i, country=country, priority=True)
+    account = User.objects.create_user("AirCompany{}".format(i))
+    airline = Airline.objects.create(name="Airline {}".format(i), iata_code="{:02d}".format(i),
+                                     icao_code="L{:02d}".format(i), account=account, priority=True)
+    model = AircraftType.objects.create(model="Type {}".format(i), icao_code="T{:02d}".format(i))
+    aircraft = Aircraft.objects.create(reg="RA-{:05d}".format(i), model=model, airline=airline, hub=hub)
+    pilots = [Pilot.objects.create(first_name="Иван", last_name="Иванов", patronymic="Иванович", sex="M",
+                                   type_pilot=type_pilot, airline=airline, hub=hub)
+              for type_pilot in ("C", "S", "E")]
+    steward = Steward.objects.create(first_name="Анна", last_name="Иванова", patronymic="Ивановна", sex="W",
+                                     hub=hub, airline=airline)
+    crew = Crew.objects.create(pic=pilots[0], co_pilot=pilots[1], engineer=pilots[2])
+    crew.steward.add(steward)
+    route = Route.objects.create(number=100 + i, from_airport=hub, to_airport=airport, airline=airline,
+                                 days_of_week="1234567", from_scheduled_time=datetime.time(10),
+                                 to_scheduled_time=datetime.time(12))
+    departure = datetime.datetime(2026, 1, 1, 10, tzinfo=datetime.timezone.utc) + datetime.timedelta(days=i)
+    flight = FlightRouteLime.objects.create(route=route, from_datetime=departure,
+                                            to_datetime=departure + datetime.timedelta(hours=2),
+                                            crew=crew, aircraft=aircraft)
+    return flight
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class QueryCountTest(TestCase):
+    # Pages must not run one query per row: the count has to stay the same when the rows double
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser("admin", "admin@lime.ru", "password")
+        self.rows = 0
+        self.add_rows(3)
+
+    def add_rows(self, count):
+        for i in range(self.rows, self.rows + count):
+            create_row(i)
+        self.rows += count
+
+    def count_queries(self, url):
+        # The first request fills process-wide caches (content types and such)
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context)
+
+    def assertConstantQueries(self, url):
+        before = self.count_queries(url)
+        self.add_rows(self.rows)
+        self.assertEqual(self.count_queries(url), before, url)
+
+    def test_catalog_pages(self):
+        for url in ["/airports/", "/airlines/", "/countries/", "/airport/A00/"]:
+            self.assertConstantQueries(url)
+
+    def test_admin_changelists(self):
+        self.client.force_login(self.admin)
+        for model in ["airport", "aircraft", "pilot", "steward", "route", "flightroutelime", "crew"]:
+            self.assertConstantQueries("/admin/data/{}/".format(model))
+
+    def test_admin_flight_form(self):
+        self.client.force_login(self.admin)
+        flight = FlightRouteLime.objects.first()
+        self.assertConstantQueries("/admin/data/flightroutelime/{}/change/".format(flight.pk))
+
+
+class ConflictTest(TestCase):
+    def setUp(self):
+        self.flight = create_row(0)
+
+    def booking(self, hour, hours):
+        start = self.flight.from_datetime.replace(hour=hour)
+        return FlightRouteLime(route=self.flight.route, from_datetime=start,
+                               to_datetime=start + datetime.timedelta(hours=hours), aircraft=self.flight.aircraft)
+
+    def test_existing_overlap_does_not_hide_conflicts(self):
+        # The flight of the row is 10:00-12:00; a long booking already overlapping it must still be seen
+        self.booking(0, 14).save()
+        self.booking(10, 1).save()
+        found = check_flights([self.booking(11, 1), self.booking(13, 2)])
+        self.assertEqual([f.from_datetime.hour for f, conflicts in found], [11, 13])
+        self.assertEqual(len(found[1][1]), 1)
+
+    def test_crew_conflict_is_reported_once(self):
+        # The whole crew (three pilots and a steward) is on both flights
+        clash = self.booking(11, 2)
+        clash.aircraft = None
+        clash.crew = self.flight.crew
+        self.assertEqual(check_flights([clash]), [(clash, [(self.flight.id, "crew")])])
+
+
+class SolverTest(TestCase):
+    # Row 0 of create_row without crew and aircraft: hub H00, airport A00 and the flight H00-A00 10:00-12:00
+    day = datetime.date(2026, 1, 1)
+
+    def setUp(self):
+        self.flight = create_row(0)
+        self.aircraft = self.flight.aircraft
+        self.crew = self.flight.crew
+        self.hub = self.flight.route.from_airport
+        self.airport = self.flight.route.to_airport
+        FlightRouteLime.objects.update(crew=None, aircraft=None)
+        self.flight.refresh_from_db()
+
+    def add_flight(self, from_airport, to_airport, hour, minute=0, hours=2, **kwargs):
+        route = Route.objects.create(number=Route.objects.count() + 100, from_airport=from_airport,
+                                     to_airport=to_airport, airline=self.flight.route.airline, days_of_week="1234567",
+                                     from_scheduled_time=datetime.time(hour, minute),
+                                     to_scheduled_time=datetime.time(hour + hours, minute))
+        departure = datetime.datetime.combine(self.day, datetime.time(hour, minute), tzinfo=datetime.timezone.utc)
+        return FlightRouteLime.objects.create(route=route, from_datetime=departure,
+                                              to_datetime=departure + datetime.timedelta(hours=hours), **kwargs)
+
+    def add_overnight(self, **kwargs):
+        # H00-A00 from 22:00 the day before until 03:00
+        departure = datetime.datetime.combine(self.day, datetime.time(22), tzinfo=datetime.timezone.utc)
+        departure -= datetime.timedelta(days=1)
+        return FlightRouteLime.objects.create(route=self.flight.route, from_datetime=departure,
+                                              to_datetime=departure + datetime.timedelta(hours=5), **kwargs)
+
+    def assertNoConflicts(self):
+        self.assertEqual(check_flights(FlightRouteLime.objects.all()), [])
+
+
+class TailAssignerTest(SolverTest):
+    def plan(self, reassign=False):
+        return TailAssigner().assign_week(self.day, days=1, reassign=reassign)
+
+    def test_continuity_and_turnaround(self):
+        # The aircraft lands at A00 at 12:00 and needs 45 minutes before it can leave again
+        too_soon = self.add_flight(self.airport, self.hub, 12, 30)
+        back = self.add_flight(self.airport, self.hub, 13)
+        elsewhere = self.add_flight(self.airport, self.hub, 16)
+        plan = self.plan()
+        self.assertEqual(sorted(plan.assignments), [self.flight.id, back.id])
+        self.assertEqual(sorted(f.id for f, reason in plan.unassigned), [too_soon.id, elsewhere.id])
+        plan.apply()
+        self.assertNoConflicts()
+
+    def test_reassign_releases_unplaced_flights(self):
+        # A double booking: the solver keeps the aircraft for 10:00 and must take it off 11:00
+        self.flight.aircraft = self.aircraft
+        self.flight.save()
+        overlapping = self.add_flight(self.hub, self.airport, 11, aircraft=self.aircraft)
+        plan = self.plan(reassign=True)
+        self.assertEqual([f.id for f in plan.released], [overlapping.id])
+        plan.apply()
+        overlapping.refresh_from_db()
+        self.assertIsNone(overlapping.aircraft_id)
+        self.assertNoConflicts()
+
+    def test_inactive_aircraft_is_reported(self):
+        self.aircraft.status = False
+        self.aircraft.save()
+        self.flight.aircraft = self.aircraft
+        self.flight.save()
+        plan = self.plan()
+        self.assertEqual([(f.id, reason) for f, reason in plan.unassigned],
+                         [(self.flight.id, "the aircraft is inactive or not in the airline fleet")])
+
+    def test_overnight_flight_of_the_day_before(self):
+        # The aircraft is in the air until 03:00 and then at A00, not at its hub
+        self.add_overnight(aircraft=self.aircraft)
+        airborne = self.add_flight(self.hub, self.airport, 1)
+        back = self.add_flight(self.airport, self.hub, 5)
+        plan = self.plan()
+        self.assertEqual(sorted(plan.assignments), [self.flight.id, back.id])
+        self.assertEqual([f.id for f, reason in plan.unassigned], [airborne.id])
+        plan.apply()
+        self.assertNoConflicts()
+
+
+class CrewAssignerTest(SolverTest):
+    def setUp(self):
+        super().setUp()
+        for pilot in (self.crew.pic, self.crew.co_pilot, self.crew.engineer):
+            pilot.ratings.add(self.aircraft.model)
+        self.flight.aircraft = self.aircraft
+        self.flight.save()
+
+    def another_aircraft(self, model=None):
+        # Every flight gets its own aircraft, so only the crews can conflict
+        return Aircraft.objects.create(reg="RA-{:05d}".format(Aircraft.objects.count() + 100),
+                                       model=model or self.aircraft.model, airline=self.aircraft.airline,
+                                       hub=self.hub)
+
+    def plan(self, reassign=False):
+        return CrewAssigner(min_rest=45).assign_day(self.day, reassign=reassign)
+
+    def test_continuity_and_rest(self):
+        # The crew lands at A00 at 12:00 and rests 45 minutes
+        too_soon = self.add_flight(self.airport, self.hub, 12, 30, aircraft=self.another_aircraft())
+        back = self.add_flight(self.airport, self.hub, 13, aircraft=self.another_aircraft())
+        elsewhere = self.add_flight(self.airport, self.hub, 16, aircraft=self.another_aircraft())
+        plan = self.plan()
+        self.assertEqual(sorted(plan.assignments), [self.flight.id, back.id])
+        self.assertEqual(sorted((f.id, reason) for f, reason in plan.unassigned),
+                         [(too_soon.id, "no free rated crew at the departure airport"),
+                          (elsewhere.id, "no free rated crew at the departure airport")])
+        plan.apply()
+        self.assertNoConflicts()
+
+    def test_ratings_and_aircraft(self):
+        other_type = AircraftType.objects.create(model="Other", icao_code="OTH")
+        self.flight.aircraft = self.another_aircraft(other_type)
+        self.flight.save()
+        no_aircraft = self.add_flight(self.hub, self.airport, 14)
+        plan = self.plan()
+        self.assertEqual(plan.assignments, {})
+        self.assertEqual(sorted((f.id, reason) for f, reason in plan.unassigned),
+                         [(self.flight.id, "no free rated crew at the departure airport"),
+                          (no_aircraft.id, "no aircraft")])
+
+    def test_reassign_releases_unplaced_flights(self):
+        self.flight.crew = self.crew
+        self.flight.save()
+        overlapping = self.add_flight(self.hub, self.airport, 11, aircraft=self.another_aircraft(), crew=self.crew)
+        plan = self.plan(reassign=True)
+        self.assertEqual([f.id for f in plan.released], [overlapping.id])
+        plan.apply()
+        overlapping.refresh_from_db()
+        self.assertIsNone(overlapping.crew_id)
+        self.assertNoConflicts()
+
+    def test_overnight_flight_of_the_day_before(self):
+        # The crew is on duty until 03:45 and then at A00, not at the hub
+        self.add_overnight(aircraft=self.another_aircraft(), crew=self.crew)
+        airborne = self.add_flight(self.hub, self.airport, 1, aircraft=self.another_aircraft())
+        back = self.add_flight(self.airport, self.hub, 5, aircraft=self.another_aircraft())
+        plan = self.plan()
+        self.assertEqual(sorted(plan.assignments), [self.flight.id, back.id])
+        self.assertEqual([f.id for f, reason in plan.unassigned], [airborne.id])
+        plan.apply()
+        self.assertNoConflicts()
+
+
+class WorldBuilderTest(TestCase):
+    def test_world_is_consistent(self):
+        country = Country.objects.create(name="Country")
+        for i in range(30):
+            Airport.objects.create(name="Airport {}".format(i), iata_code="A{:02d}".format(i),
+                                   icao_code="AA{:02d}".format(i), lat=i, lng=i, country=country)
+        for i in range(3):
+            account = User.objects.create_user("AirCompany{}".format(i))
+            Airline.objects.create(name="Airline {}".format(i), iata_code="{:02d}".format(i),
+                                   icao_code="L{:02d}".format(i), account=account)
+        for i in range(3):
+            AircraftType.objects.create(model="Type {}".format(i), icao_code="T{:02d}".format(i))
+
+        total = WorldBuilder("small", seed=1, start=datetime.date(2026, 1, 5), log=lambda *args: None,
+                             days=3).build()
+        self.assertEqual(total["flights"], FlightRouteLime.objects.count())
+        self.assertTrue(FlightRouteLime.objects.filter(aircraft__isnull=False, crew__isnull=False).exists())
+        self.assertEqual(check_flights(FlightRouteLime.objects.all()), [])
+
+
+class Catalog:
+    # Stands in for FR24 with fixed airline and airport lists
+    def __init__(self, airlines=(), airports=()):
+        self.airlines = [engine.Airline(name, iata, icao) for name, iata, icao in airlines]
+        self.airports = [engine.Airport(name, iata, icao, 0, 0, "Country", 0) for name, iata, icao in airports]
+
+    def get_airlines(self):
+        return self.airlines
+
+    def get_airports(self):
+        return self.airports
+
+    def get_countries(self):
+        return ["Country"]
+
+
+class CreateAirportsTest(TestCase):
+    def setUp(self):
+        engine.create_airports(Catalog(airports=[("A", "XXX", "XXXX"), ("C", "ZZZ", "ZZZZ"), ("E", "EEE", "EEEE"),
+                                                 ("F", "FFF", "FFFF")]))
+
+    def codes(self):
+        return {a.name: (a.iata_code, a.icao_code) for a in Airport.objects.all()}
+
+    def check_moves(self, airports):
+        # A gives XXX up to the new B, E and F swap codes, C is not in the catalog and keeps ZZZ from G
+        result = engine.create_airports(Catalog(airports=airports))
+        self.assertEqual(result, {"created": 1, "updated": 3, "skipped": 1})
+        self.assertEqual(self.codes(), {"A": ("YYY", "YYYY"), "B": ("XXX", "XXXX"), "C": ("ZZZ", "ZZZZ"),
+                                        "E": ("FFF", "FFFF"), "F": ("EEE", "EEEE")})
+
+    def test_code_moves(self):
+        self.check_moves([("A", "YYY", "YYYY"), ("B", "XXX", "XXXX"), ("E", "FFF", "FFFF"), ("F", "EEE", "EEEE"),
+                          ("G", "ZZZ", "GGGG")])
+
+    def test_code_moves_in_any_order(self):
+        self.check_moves([("G", "ZZZ", "GGGG"), ("F", "EEE", "EEEE"), ("B", "XXX", "XXXX"), ("E", "FFF", "FFFF"),
+                          ("A", "YYY", "YYYY")])
+
+    def test_refused_move_keeps_the_old_codes(self):
+        # A cannot take ZZZ from C, so it keeps XXX and B, wanting XXX, is turned away as well
+        result = engine.create_airports(Catalog(airports=[("B", "XXX", "XXXX"), ("A", "ZZZ", "YYYY")]))
+        self.assertEqual(result, {"created": 0, "updated": 0, "skipped": 2})
+        self.assertEqual(self.codes()["A"], ("XXX", "XXXX"))
+
+
+class SyncAirlinesTest(TestCase):
+    def test_reused_icao_gets_a_free_account(self):
+        engine.sync_airlines(Catalog([("Alpha", "AL", "ABC")]))
+        # Alpha moves to ABD and a new airline takes ABC: AirCompanyABC still belongs to Alpha
+        result = engine.sync_airlines(Catalog([("Alpha", "AL", "ABD"), ("Beta", "BE", "ABC")]))
+        self.assertEqual((result["inserted"], result["updated"]), (1, 1))
+        self.assertEqual(Airline.objects.get(name="Alpha").account.username, "AirCompanyABC")
+        self.assertEqual(Airline.objects.get(name="Beta").account.username, "AirCompanyABC-2")
+
+    def codes(self):
+        return {a.name: (a.iata_code, a.icao_code) for a in Airline.objects.all()}
+
+    def test_updates_chain(self):
+        engine.sync_airlines(Catalog([("One", "ON", "ONE"), ("Two", "TW", "TWO")]))
+        # One takes the code Two gives up; One has the lower id, so a single UPDATE would write it first
+        result = engine.sync_airlines(Catalog([("Two", "TW", "TRE"), ("One", "ON", "TWO")]))
+        self.assertEqual((result["inserted"], result["updated"]), (0, 2))
+        self.assertEqual(self.codes(), {"One": ("ON", "TWO"), "Two": ("TW", "TRE")})
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class ProvisionAccountsTest(TestCase):
+    def test_passwords(self):
+        old = User.objects.create_user("old", password="old")
+        accounts = engine.provision_accounts(["old", "own", "shared"], password="shared",
+                                             passwords={"own": "secret"}, workers=1)
+        self.assertEqual(accounts["old"], old.id)
+        users = {u.username: u for u in User.objects.all()}
+        self.assertTrue(users["old"].check_password("old"))
+        self.assertTrue(users["own"].check_password("secret"))
+        self.assertTrue(users["shared"].check_password("shared"))
+
+    def test_hashed(self):
+        copied = User.objects.create_user("copied", password="copied").password
+        engine.provision_accounts(["a", "b"], passwords={"a": copied}, hashed=True)
+        users = {u.username: u for u in User.objects.all()}
+        self.assertTrue(users["a"].check_password("copied"))
+        # No hash given: the account cannot sign in with a password
+        self.assertFalse(users["b"].has_usable_password())
+
+
+class GenerateCrewTest(TestCase):
+    def setUp(self):
+        self.flight = create_row(0)
+
+    def generate(self, seed):
+        return engine.generate_crew(Pilot, 2, 1, code_hub="H00", iata_code="00", seed=seed, type_pilot="S",
+                                    ratings=["T00"])
+
+    def test_pilots(self):
+        pilots = self.generate(seed=1)
+        self.assertEqual([p.sex for p in pilots], ["M", "M", "W"])
+        for p in pilots:
+            self.assertIsNotNone(p.pk)
+            self.assertEqual((p.type_pilot, p.hub_id, p.airline_id),
+                             ("S", self.flight.route.from_airport_id, self.flight.route.airline_id))
+            self.assertEqual([t.icao_code for t in p.ratings.all()], ["T00"])
+        # The same seed gives the same people
+        again = self.generate(seed=1)
+        self.assertEqual([(p.first_name, p.last_name, p.patronymic) for p in again],
+                         [(p.first_name, p.last_name, p.patronymic) for p in pilots])
+
+
+class ExpandScheduleTest(TestCase):
+    def setUp(self):
+        # A daily route 10:00-12:00 with its flight of 2026-01-01 already there
+        self.flight = create_row(0)
+
+    def test_expand(self):
+        route = self.flight.route
+        overnight = Route.objects.create(number=200, from_airport=route.to_airport, to_airport=route.from_airport,
+                                         airline=route.airline, days_of_week="1.3....",
+                                         from_scheduled_time=datetime.time(23), to_scheduled_time=datetime.time(1))
+        Route.objects.create(number=300, from_airport=route.to_airport, to_airport=route.from_airport,
+                             airline=route.airline, days_of_week="1234567", from_scheduled_time=datetime.time(8),
+                             to_scheduled_time=datetime.time(9), is_regular=False)
+        # 2026-01-05 is a Monday: seven daily flights and the overnight ones of Monday and Wednesday
+        self.assertEqual(expand_schedule(datetime.date(2026, 1, 1), datetime.date(2026, 1, 7)), 8)
+        self.assertEqual(expand_schedule(datetime.date(2026, 1, 1), datetime.date(2026, 1, 7)), 0)
+        self.assertEqual(FlightRouteLime.objects.filter(route=route).count(), 7)
+        utc = datetime.timezone.utc
+        self.assertEqual(list(FlightRouteLime.objects.filter(route=overnight).order_by("from_datetime")
+                              .values_list("from_datetime", "to_datetime")),
+                         [(datetime.datetime(2026, 1, 5, 23, tzinfo=utc), datetime.datetime(2026, 1, 6, 1, tzinfo=utc)),
+                          (datetime.datetime(2026, 1, 7, 23, tzinfo=utc), datetime.datetime(2026, 1, 8, 1, tzinfo=utc))])
+
+
+class CatalogCacheTest(TestCase):
+    def setUp(self):
+        self.live = CatalogCache(directory="", source="http://www.flightradar24.com")
+        self.replay = CatalogCache(directory="", source="http://127.0.0.1:8765")
+
+    def tearDown(self):
+        self.live.clear("airports")
+        self.replay.clear("airports")
+
+    def test_servers_do_not_share_catalogs(self):
+        self.live.get("airports", lambda headers: (200, {}, "live"))
+        self.assertEqual(self.replay.get("airports", lambda headers: (200, {}, "replay")), "replay")
+        self.assertEqual(self.live.get("airports", lambda headers: (200, {}, "fetched again")), "live")
+
+
+class RetryAfterTest(TestCase):
+    def test_formats(self):
+        self.assertEqual(parse_retry_after("120"), 120)
+        self.assertEqual(parse_retry_after("soon"), None)
+        # Dates in the past mean "now", with or without a time zone
+        self.assertEqual(parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT"), 0)
+        self.assertEqual(parse_retry_after("Wed, 21 Oct 2015 07:28:00 -0000"), 0)
+        later = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(minutes=10)
+        self.assertAlmostEqual(parse_retry_after(later.strftime("%a, %d %b %Y %H:%M:%S -0000")), 600, delta=5)
@@ -0,0 +1,95 @@
+from data.flights import iter_feed
+from data.resilience import BatchResult
+from django.conf import settings
+
+# Tiles are quadtree cells (depth, x, y): at depth d the globe is cut into 2^d x 2^d boxes,
+# x counts from the antimeridian to the east and y from the south pole to the north.
+WORLD = (0, 0, 0)
+
+
+def tile_bounds(tile):
+    depth, x, y = tile
+    width = 360.0 / 2 ** depth
+    height = 180.0 / 2 ** depth
+    west = -180 + x * width
+    south = -90 + y * height
+    return south + height, south, west, west + width
+
+
+def tile_children(tile):
+    depth, x, y = tile
+    return [(depth + 1, 2 * x + dx, 2 * y + dy) for dx in (0, 1) for dy in (0, 1)]
+
+
+def tile_parent(tile):
+    depth, x, y = tile
+    return depth - 1, x // 2, y // 2
+
+
+class ZoneTiler:
+    def __init__(self, fr24, split_threshold=None, merge_threshold=None, max_depth=None):
+        if split_threshold is None:
+            split_threshold = getattr(settings, "FR24_TILE_SPLIT", 1000)
+        if merge_threshold is None:
+            # Well below the split threshold, so a tile does not flip between split and merged every cycle
+            merge_threshold = split_threshold // 2
+        if max_depth is None:
+            max_depth = getattr(settings, "FR24_TILE_MAX_DEPTH", 8)
+        self.fr24 = fr24
+        self.split_threshold = split_threshold
+        self.merge_threshold = merge_threshold
+        self.max_depth = max_depth
+
+        # Tiling of the last cycle, the next one starts from it
+        self.tiles = [WORLD]
+        self.counts = {}
+
+    def get_flights(self):
+        flights = {}
+        counts = {}
+        errors = {}
+        pending = sorted(self.tiles)
+        while pending:
+            answers = self.fr24.get_flights_in_zones([tile_bounds(t) for t in pending])
+            for i, error in getattr(answers, "errors", {}).items():
+                errors[pending[i]] = error
+            split = []
+            for tile, answer in zip(pending, answers):
+                if answer is None:
+                    # Failed tile: keep it as it was, the next cycle asks again
+                    counts[tile] = self.counts.get(tile, 0)
+                    continue
+                records = dict(iter_feed(answer))
+                flights.update(records)
+
+                # full_count in the feed is the global total, the truncation shows in the number of records
+                if len(records) >= self.split_threshold and tile[0] < self.max_depth:
+                    split.extend(tile_children(tile))
+                else:
+                    counts[tile] = len(records)
+            pending = split
+
+        self.counts = self.merge(counts)
+        self.tiles = sorted(self.counts)
+        return BatchResult([[flight, flights[flight]] for flight in flights], errors=errors)
+
+    def merge(self, counts):
+        counts = dict(counts)
+        changed = True
+        while changed:
+            changed = False
+            parents = {}
+            for tile in counts:
+                if tile[0] > 0:
+                    parents.setdefault(tile_parent(tile), []).append(tile)
+
+            for parent, children in parents.items():
+                if len(children) < 4:
+                    continue
+                total = sum(counts[c] for c in children)
+                if total < self.merge_threshold:
+                    for c in children:
+                        del counts[c]
+                    counts[parent] = total
+                    changed = True
+        return counts
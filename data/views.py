@@ -1,12 +1,15 @@
 from django.shortcuts import render
 from django.contrib.auth.models import User
-from .forms import UserForm, AirlineForm
+from .forms import UserForm, AirlineForm, CatalogFilterForm
 from django.contrib.auth import login, logout, authenticate
 from django.shortcuts import redirect
 from django.contrib.auth.forms import AuthenticationForm
 from django.shortcuts import get_object_or_404
+from django.http import Http404
 
 from data.models import Country, Airport, AircraftType, Aircraft, Airline, Pilot, Steward
+from data.caching import cached_view, versions
+from data.pagination import keyset_page, InvalidCursor
 
 
 def login_profile(request):
@@ -69,37 +72,58 @@ def reg_profile(request):
                                               "airline_form": airline_form})
 
 
+def show_catalog(request, queryset, template, name, exclude=()):
+    form = CatalogFilterForm(request.GET, exclude=exclude)
+    try:
+        page = keyset_page(form.filter(queryset), request.GET.get("cursor"))
+    except InvalidCursor:
+        raise Http404("Неверная страница")
+    next_url = None
+    if page.has_next:
+        params = request.GET.copy()
+        params["cursor"] = page.next_cursor
+        next_url = "?" + params.urlencode()
+    context = dict(versions(name), data=page, form=form, next_url=next_url, page_key=request.get_full_path())
+    return render(request, template, context)
+
+
+@cached_view("airport")
 def show_airports(request):
-    d = Airport.objects.filter(priority=True)
+    d = Airport.objects.select_related('country')
     template = 'data/airports.html'
-    return render(request, template, {'data': d})
+    return show_catalog(request, d, template, "airport")
 
 
+@cached_view("airline")
 def show_airlines(request):
-    d = Airline.objects.filter(priority=True)
+    d = Airline.objects.all()
     template = 'data/airlines.html'
-    return render(request, template, {'data': d})
+    return show_catalog(request, d, template, "airline", exclude=["country"])
 
 
+@cached_view("country")
 def show_countries(request):
-    d = Country.objects.filter(priority=True)
+    d = Country.objects.all()
     template = 'data/countries.html'
-    return render(request, template, {'data': d})
+    return show_catalog(request, d, template, "country", exclude=["country", "iata", "icao"])
 
 
+@cached_view("country")
 def show_one_country(request, name):
     d = get_object_or_404(Country, name=name)
     template = 'data/one_country.html'
-    return render(request, template, {'data': d})
+    return render(request, template, dict(versions(), data=d))
 
 
+@cached_view("airline")
 def show_one_airline(request, icao):
     d = get_object_or_404(Airline, icao_code=icao)
     template = 'data/one_airline.html'
-    return render(request, template, {'data': d})
+    return render(request, template, dict(versions(), data=d))
 
 
+@cached_view("airport")
 def show_one_airport(request, iata):
-    d = get_object_or_404(Airport, iata_code=iata)
+    d = get_object_or_404(Airport.objects.select_related('country'), iata_code=iata)
     template = 'data/one_airport.html'
-    return render(request, template, {'data': d})
+    return render(request, template, dict(versions(), data=d))
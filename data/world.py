@@ -0,0 +1,167 @@
+from data.models import Airport, Airline, AircraftType, Aircraft, Pilot, Steward, Route, Crew, FlightRouteLime
+from data.engine import FR24, create_airports, create_type_aircraft, sync_airlines, generate_crew, \
+    bulk_create_with_ids, batch_size
+from data.schedule import plan_flights
+from data.rotation import TailAssigner
+from data.crewing import CrewAssigner
+from django.db import transaction
+from django.utils import timezone
+import datetime
+import random
+
+presets = {
+    "small": {
+        "airlines": 3,
+        "aircraft": 10,
+        "crews": 15,
+        "stewards": 4,
+        "routes": 20,
+        "days": 14,
+    },
+    "medium": {
+        "airlines": 20,
+        "aircraft": 40,
+        "crews": 60,
+        "stewards": 4,
+        "routes": 100,
+        "days": 60,
+    },
+    "large": {
+        "airlines": 50,
+        "aircraft": 120,
+        "crews": 200,
+        "stewards": 5,
+        "routes": 300,
+        "days": 90,
+    },
+}
+
+# Every day, Monday first; a "." marks a day off (see data.schedule)
+week = "1234567"
+
+
+class WorldBuilder:
+    def __init__(self, preset="small", seed=None, start=None, log=print, **sizes):
+        self.sizes = dict(presets[preset], **{k: v for k, v in sizes.items() if v is not None})
+        self.seed = seed
+        self.rnd = random.Random(seed)
+        self.start = start or timezone.now().date()
+        self.log = log
+
+    def build(self, fr24=None):
+        self.load_catalogs(fr24)
+        airlines = self.pick_airlines()
+        airports = list(Airport.objects.all())
+        types = list(AircraftType.objects.all())
+        total = {"airlines": len(airlines), "aircraft": 0, "crews": 0, "routes": 0, "flights": 0}
+        for airline in airlines:
+            with transaction.atomic():
+                hub = self.rnd.choice(airports)
+                fleet_types = self.rnd.sample(types, min(3, len(types)))
+                fleet = self.build_fleet(airline, hub, fleet_types)
+                crews = self.build_crews(airline, hub, fleet_types)
+                routes = self.build_routes(airline, hub, airports)
+                flights = self.build_flights(routes)
+            total["aircraft"] += len(fleet)
+            total["crews"] += len(crews)
+            total["routes"] += len(routes)
+            total["flights"] += flights
+            self.log("{}: {} aircraft, {} crews, {} routes, {} flights".format(
+                airline.icao_code, len(fleet), len(crews), len(routes), flights))
+        return total
+
+    def load_catalogs(self, fr24):
+        # Catalog imports are diffs, they cost little when the tables are already filled
+        if not Airport.objects.exists() or not Airline.objects.exists():
+            fr24 = fr24 or FR24()
+            create_airports(fr24)
+            sync_airlines(fr24)
+        if not AircraftType.objects.exists():
+            create_type_aircraft()
+
+    def pick_airlines(self):
+        airlines = list(Airline.objects.order_by("icao_code"))
+        return self.rnd.sample(airlines, min(self.sizes["airlines"], len(airlines)))
+
+    def build_fleet(self, airline, hub, fleet_types):
+        taken = set(Aircraft.objects.filter(reg__startswith=airline.icao_code + "-").values_list("reg", flat=True))
+        fleet = []
+        n = 0
+        while len(fleet) < self.sizes["aircraft"]:
+            reg = "{}-{:05d}".format(airline.icao_code, n)
+            n += 1
+            if reg in taken:
+                continue
+            fleet.append(Aircraft(reg=reg, model=self.rnd.choice(fleet_types), airline=airline, hub=hub))
+        return bulk_create_with_ids(Aircraft, fleet)
+
+    def build_crews(self, airline, hub, fleet_types):
+        count = self.sizes["crews"]
+        ratings = [t.icao_code for t in fleet_types]
+        seed = self.rnd.randrange(2 ** 32)
+        pilots = {}
+        for type_pilot in ("C", "S", "E"):
+            half = count // 2
+            pilots[type_pilot] = generate_crew(Pilot, half, count - half, code_hub=hub.iata_code,
+                                               iata_code=airline.iata_code, seed="{}-{}".format(seed, type_pilot),
+                                               type_pilot=type_pilot, ratings=ratings)
+        stewards_count = count * self.sizes["stewards"]
+        stewards = generate_crew(Steward, stewards_count // 3, stewards_count - stewards_count // 3,
+                                 code_hub=hub.iata_code, iata_code=airline.iata_code, seed="{}-steward".format(seed))
+
+        crews = [Crew(pic=pilots["C"][i], co_pilot=pilots["S"][i], engineer=pilots["E"][i]) for i in range(count)]
+        bulk_create_with_ids(Crew, crews)
+
+        through = Crew.steward.through
+        per_crew = self.sizes["stewards"]
+        rows = [through(crew_id=crew.pk, steward_id=stewards[i * per_crew + j].pk)
+                for i, crew in enumerate(crews) for j in range(per_crew)]
+        through.objects.bulk_create(rows, batch_size=batch_size)
+        return crews
+
+    def build_routes(self, airline, hub, airports):
+        destinations = [a for a in airports if a.pk != hub.pk]
+        routes = []
+        for i in range(self.sizes["routes"] // 2):
+            destination = self.rnd.choice(destinations)
+            days = "".join(d if self.rnd.random() < 0.7 else "." for d in week)
+            if days == "." * 7:
+                days = week
+            departure = datetime.datetime.combine(self.start, datetime.time(self.rnd.randrange(5, 23),
+                                                                            self.rnd.choice((0, 15, 30, 45))))
+            duration = datetime.timedelta(minutes=self.rnd.randrange(60, 600, 5))
+            turnaround = datetime.timedelta(minutes=self.rnd.randrange(45, 120, 5))
+            back = departure + duration + turnaround
+            # Outbound from the hub (odd number) and the return leg after a turnaround (even number)
+            legs = ((101 + 2 * i, hub, destination, departure), (102 + 2 * i, destination, hub, back))
+            for number, from_airport, to_airport, start in legs:
+                routes.append(Route(
+                    number=number,
+                    from_airport=from_airport,
+                    to_airport=to_airport,
+                    airline=airline,
+                    days_of_week=days,
+                    from_scheduled_time=start.time(),
+                    to_scheduled_time=(start + duration).time(),
+                    is_international=from_airport.country_id != to_airport.country_id,
+                ))
+        return bulk_create_with_ids(Route, routes)
+
+    def build_flights(self, routes):
+        # Aircraft and crews come from the rotation and crew solvers, so the world has no double bookings,
+        # every aircraft and crew departs from where it last landed and turnarounds and rests hold.
+        # Flights the solvers cannot cover are left without an aircraft or crew.
+        end = self.start + datetime.timedelta(days=self.sizes["days"] - 1)
+        flights = plan_flights(routes, self.start, end)
+        for flight in flights:
+            flight.actual_from_datetime = flight.from_datetime
+            flight.actual_to_datetime = flight.to_datetime
+        bulk_create_with_ids(FlightRouteLime, flights)
+        rotation = TailAssigner().assign(flights)
+        rotation.apply()
+        crewing = CrewAssigner().assign(flights)
+        crewing.apply()
+        if rotation.unassigned or crewing.unassigned:
+            self.log("{} flights without an aircraft, {} without a crew".format(
+                len(rotation.unassigned), len(crewing.unassigned)))
+        return len(flights)
@@ -144,3 +144,65 @@ AWS_STORAGE_BUCKET_NAME = 'lime_main'
 
 LOGIN_URL = "/auth/login/"
 LOGOUT_REDIRECT_URL = "/"
+
+# Local copy of the FR24 airport and airline catalogs
+FR24_CACHE_DIR = os.path.join(BASE_DIR, 'cache', 'fr24')
+FR24_CACHE_TTL = 24 * 60 * 60
+
+# Keep-alive connections kept by one FR24 client: per host and number of hosts
+FR24_POOL_SIZE = 100
+FR24_POOL_HOSTS = 10
+
+# Requests in flight at once for AsyncFR24
+FR24_CONCURRENCY = 100
+
+# Longest feed URL the FR24 servers accept
+FR24_MAX_URL_LENGTH = 2000
+
+# Zone polling: a tile with this many flights is split in four, up to FR24_TILE_MAX_DEPTH levels
+FR24_TILE_SPLIT = 1000
+FR24_TILE_MAX_DEPTH = 8
+
+# FR24 retries: attempts per request and exponential backoff in seconds
+FR24_RETRY_ATTEMPTS = 4
+FR24_RETRY_BACKOFF = 0.5
+FR24_RETRY_MAX_BACKOFF = 30
+# An endpoint is skipped for FR24_BREAKER_RESET seconds after this many failures in a row
+FR24_BREAKER_FAILURES = 5
+FR24_BREAKER_RESET = 30
+
+# Client-side FR24 rate limits per endpoint group: (requests per second, burst)
+FR24_RATE_LIMITS = {
+    'static': (1, 5),
+    'dynamic': (10, 20),
+}
+
+# FR24 hosts, can point at a local replay server (manage.py fr24_replay)
+FR24_BASE_URL = "http://www.flightradar24.com"
+FR24_API_URL = "http://data-live.flightradar24.com"
+# Directory to record every FR24 answer into, None disables recording
+FR24_RECORD_DIR = None
+
+# Minutes a crew rests between two flights
+CREW_MIN_REST = 45
+
+# Upper bound of a flight duration in hours, used to bound the double-booking range scans
+FLIGHT_MAX_DURATION = 24
+
+# Minutes a passenger needs to change flights at an airport (data.network)
+MIN_CONNECTION_TIME = 60
+
+# Catalog pages and fragments are cached here (data.caching), invalidated on every change.
+# Any Django cache backend works, e.g. FileBasedCache with LOCATION os.path.join(BASE_DIR, 'cache', 'pages')
+# or 'django.core.cache.backends.redis.RedisCache' with LOCATION 'redis://127.0.0.1:6379'
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'lime',
+    },
+}
+CATALOG_CACHE = 'default'
+CATALOG_CACHE_TIMEOUT = 60 * 60
+
+# Rows per page of the catalog listings
+CATALOG_PAGE_SIZE = 60